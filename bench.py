@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+from graph import CSRGraph, as_csr
+import interface
+import seeds
+import sim
+
+# Version of the results format
+FORMAT_VERSION = 1
+# Synthetic graph families, each given a size, average degree & random seed
+FAMILIES = {
+    "er": lambda n, d, seed: nx.fast_gnp_random_graph(
+        n, d / max(n - 1, 1), seed=seed),
+    "powerlaw": lambda n, d, seed: nx.barabasi_albert_graph(
+        n, max(d // 2, 1), seed=seed),
+    "smallworld": lambda n, d, seed: nx.watts_strogatz_graph(
+        n, max(d, 2), 0.1, seed=seed),
+}
+# Number of rankings inserted into the heap in its benchmarks, & the number
+# it keeps
+HEAP_SIZE = 100000
+HEAP_CAPACITY = 1000
+# Slowdowns of less than this many seconds are within timing noise, and are
+# never regressions
+NOISE_SECONDS = 0.001
+
+def generate(family, n, degree, seed):
+    # Build a synthetic graph as an adjacency list dictionary, as it would be
+    # loaded from JSON
+    G = FAMILIES[family](n, degree, seed)
+    return {node: list(G[node]) for node in G}
+
+def measure(function, repeat, memory):
+    # Time the given function (taking the fastest of several runs, which is
+    # the least disturbed by other processes), and optionally measure its
+    # peak memory in a separate run, since tracing slows it down
+    seconds = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds = min(seconds, time.perf_counter() - start)
+    result = {"seconds": seconds}
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+def fresh(graph):
+    # Copy of a CSR graph without any of its lazily computed arrays, so that
+    # every run does the same work
+    return CSRGraph(graph.offsets, graph.neighbors, graph.ids)
+
+def bench_metrics(graph, metrics, count, repeat, memory):
+    results = {}
+    # For each metric
+    for metric in metrics:
+        # Select count seeds using only this metric, from a fresh graph
+        # context (so that no ranking is memoized)
+        results["metric/" + metric] = measure(
+            lambda: seeds.SeedSelector(fresh(graph), **{metric: count}),
+            repeat, memory)
+    return results
+
+def bench_simulation(adj_list, graph, count, games, repeat, memory):
+    results = {}
+    # Play the highest degree nodes against random nodes
+    ids = graph.id_list()
+    order = np.argsort(-graph.degree, kind="stable")
+    rng = np.random.default_rng(0)
+    mappings = {
+        "degree": [[ids[i] for i in order[:count]]] * games,
+        "random": [[ids[i] for i in rng.choice(len(graph), count,
+                                               replace=False)]] * games}
+    # For each simulation engine
+    for engine in [sim.DICT, sim.CSR]:
+        result = measure(
+            lambda: sim.run(adj_list if engine == sim.DICT else fresh(graph),
+                            mappings, games, engine=engine, seed=0),
+            repeat, memory)
+        result["rate"] = games / result["seconds"]
+        results["simulation/" + engine] = result
+    return results
+
+def bench_heap(capacity, repeat, memory):
+    results = {}
+    rng = np.random.default_rng(0)
+    ranks = rng.random(HEAP_SIZE)
+    IDs = np.arange(HEAP_SIZE, dtype=np.int64)
+
+    def insert():
+        heap = interface.rank_heap(capacity)
+        for rank, ID in zip(ranks.tolist(), IDs.tolist()):
+            heap.insert(rank, ID)
+        return heap
+
+    def insert_many():
+        heap = interface.rank_heap(capacity)
+        heap.insert_many(ranks, IDs)
+        return heap
+
+    def get_max():
+        heap = insert_many()
+        for i in range(heap.size()):
+            heap.get_max()
+
+    def drain():
+        insert_many().drain()
+
+    # Per-node & bulk insertion, and per-node & bulk extraction (which
+    # includes a bulk insertion to fill the heap)
+    for name, function, operations in [
+            ("insert", insert, HEAP_SIZE),
+            ("insert_many", insert_many, HEAP_SIZE),
+            ("get_max", get_max, HEAP_SIZE + capacity),
+            ("drain", drain, HEAP_SIZE + capacity)]:
+        result = measure(function, repeat, memory)
+        result["rate"] = operations / result["seconds"]
+        results["heap/" + name] = result
+    return results
+
+def run(args):
+    report = {"version": FORMAT_VERSION, "python": platform.python_version(),
+              "machine": platform.machine(), "parameters": vars(args).copy(),
+              "results": {}}
+    # Only the parameters which affect the results are recorded
+    for key in ["command", "func", "output", "baseline", "threshold"]:
+        report["parameters"].pop(key)
+    results = report["results"]
+
+    # For each graph family & size
+    for family in args.families:
+        for n in args.sizes:
+            name = "{}-{}".format(family, n)
+            sys.stderr.write("{}\n".format(name))
+            adj_list = generate(family, n, args.degree, args.seed)
+            graph = as_csr(adj_list)
+            for key, result in bench_metrics(
+                    graph, args.metrics, args.count, args.repeat,
+                    args.memory).items():
+                results[name + "/" + key] = result
+            for key, result in bench_simulation(
+                    adj_list, graph, args.count, args.games, args.repeat,
+                    args.memory).items():
+                results[name + "/" + key] = result
+    results.update(bench_heap(HEAP_CAPACITY, args.repeat, args.memory))
+
+    # Write the results as JSON
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    # Compare them against the baseline, if one was given (on stderr, so
+    # that the results can still be piped)
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            return compare_reports(json.load(f), report, args.threshold,
+                                   sys.stderr)
+    return 0
+
+def compare_reports(baseline, current, threshold, out=sys.stdout):
+    # Print the relative change of every measurement present in both reports,
+    # flagging the changes which are worse than the threshold. Returns the
+    # number of regressions.
+    regressions = 0
+    for name in sorted(set(baseline["results"]) & set(current["results"])):
+        old = baseline["results"][name]
+        new = current["results"][name]
+        for key in ["seconds", "peak_bytes"]:
+            if key not in old or key not in new or old[key] <= 0:
+                continue
+            change = new[key] / old[key] - 1
+            regressed = change > threshold and \
+                (key != "seconds" or new[key] - old[key] > NOISE_SECONDS)
+            regressions += regressed
+            out.write("{:<48} {:<10} {:>+8.1%}{}\n".format(
+                name, key, change, "  REGRESSION" if regressed else ""))
+    # Measurements which are only in one report cannot be compared
+    for name in sorted(set(baseline["results"]) ^ set(current["results"])):
+        out.write("{:<48} {}\n".format(
+            name, "removed" if name in baseline["results"] else "added"))
+    return regressions
+
+def compare(args):
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    with open(args.current, "r") as f:
+        current = json.load(f)
+    return compare_reports(baseline, current, args.threshold)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the seed metrics, ranking heap & simulator on "
+                    "seeded synthetic graphs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser(
+        "run", help="Run the benchmarks, and write their results as JSON")
+    run_parser.set_defaults(func=run)
+    run_parser.add_argument("-o", "--output", metavar="FILE", default="-",
+                            help="The file the results are written to (by "
+                                 "default, stdout)")
+    run_parser.add_argument("--families", metavar="FAMILY", nargs="+",
+                            choices=sorted(FAMILIES),
+                            default=sorted(FAMILIES),
+                            help="The synthetic graph families to benchmark")
+    run_parser.add_argument("--sizes", metavar="NODES", type=int, nargs="+",
+                            default=[500, 2000],
+                            help="The number of nodes of each synthetic graph")
+    run_parser.add_argument("--degree", metavar="DEGREE", type=int,
+                            default=8,
+                            help="The average degree of each synthetic graph")
+    run_parser.add_argument("--seed", metavar="SEED", type=int, default=0,
+                            help="The random seed of the synthetic graphs")
+    run_parser.add_argument("--metrics", metavar="METRIC", nargs="+",
+                            choices=seeds.SeedSelector.order,
+                            default=seeds.SeedSelector.order,
+                            help="The seed metrics to benchmark")
+    run_parser.add_argument("--count", metavar="SEEDS", type=int, default=10,
+                            help="The number of seeds selected by each metric"
+                                 " (and played in each simulated game)")
+    run_parser.add_argument("--games", metavar="GAMES", type=int, default=10,
+                            help="The number of games simulated per engine")
+    run_parser.add_argument("--repeat", metavar="RUNS", type=int, default=3,
+                            help="The number of runs of each benchmark (the "
+                                 "fastest is kept)")
+    run_parser.add_argument("--no-memory", dest="memory",
+                            action="store_false",
+                            help="Skip the extra run of each benchmark which "
+                                 "measures its peak memory")
+    run_parser.add_argument("--baseline", metavar="FILE", default=None,
+                            help="Compare the results against this earlier "
+                                 "run")
+    run_parser.add_argument("--threshold", metavar="FRACTION", type=float,
+                            default=0.1,
+                            help="The relative slowdown (or memory growth) "
+                                 "which counts as a regression")
+
+    compare_parser = commands.add_parser(
+        "compare", help="Compare two sets of results, flagging regressions")
+    compare_parser.set_defaults(func=compare)
+    compare_parser.add_argument("baseline", metavar="BASELINE",
+                                help="The results to compare against")
+    compare_parser.add_argument("current", metavar="CURRENT",
+                                help="The results to compare")
+    compare_parser.add_argument("--threshold", metavar="FRACTION",
+                                type=float, default=0.1,
+                                help="The relative slowdown (or memory growth)"
+                                     " which counts as a regression")
+
+    parsed = parser.parse_args()
+    # Exit with a failure status if any regressions were found
+    sys.exit(1 if parsed.func(parsed) else 0)
+
+if __name__ == "__main__":
+    main()
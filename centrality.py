@@ -0,0 +1,374 @@
+import time
+
+import numpy as np
+
+import interface
+
+# Number of pivots processed between checks of the stopping conditions
+PIVOT_BATCH = 16
+# Number of 64-bit words of sources searched at once by closeness
+SOURCE_WORDS = 4
+
+def _dependencies(graph, source, deadline=None):
+    # Dependencies of the source on every node, or None if the deadline (a
+    # time.perf_counter() value) passes before the search is finished
+    # Number of nodes in the graph
+    n = len(graph)
+    # Distance of each node from the source (-1 if not yet reached)
+    distance = np.full(n, -1, dtype=np.int64)
+    distance[source] = 0
+    # Number of shortest paths from the source to each node
+    sigma = np.zeros(n)
+    sigma[source] = 1
+    # (parent, child) pairs of shortest-path edges, for each BFS level
+    levels = []
+    frontier = np.array([source], dtype=np.int64)
+    depth = 0
+
+    # Breadth-first search, one whole level at a time
+    while len(frontier) > 0:
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        rows, neighbors = graph.select(frontier)
+        parents = frontier[rows]
+        # Nodes reached for the first time are one level deeper
+        discovered = np.unique(neighbors[distance[neighbors] < 0])
+        distance[discovered] = depth + 1
+        # Keep the edges which lie on a shortest path
+        on_path = distance[neighbors] == depth + 1
+        parents = parents[on_path]
+        children = neighbors[on_path]
+        np.add.at(sigma, children, sigma[parents])
+        levels.append((parents, children))
+        frontier = discovered
+        depth += 1
+
+    # Accumulate the dependency of the source on each node, deepest first
+    delta = np.zeros(n)
+    for parents, children in reversed(levels):
+        np.add.at(delta, parents,
+                  sigma[parents] / sigma[children] * (1 + delta[children]))
+    delta[source] = 0
+    return delta
+
+def approximate_betweenness(graph, count, eligible=None, pivots=None,
+                            budget=None, confidence=0.95, seed=None):
+    # Estimates betweenness centrality (normalized as networkx does) from the
+    # shortest paths of randomly sampled pivot nodes. Sampling stops when the
+    # given number of pivots or time budget (in seconds) is used up, or when
+    # the top count eligible nodes are separated from the rest by their
+    # confidence intervals. With neither limit given, sampling continues until
+    # the top nodes separate, or every node is a pivot (which is exact). The
+    # budget is checked before every pivot: a pivot is not started unless
+    # the average time of the pivots so far still fits, and one which runs
+    # past the budget anyway is abandoned. Returns the estimates, the
+    # half-widths of their confidence intervals, and a report on the top
+    # count ranking.
+    start = time.perf_counter()
+    graph = graph.undirected
+    n = len(graph)
+    if eligible is None:
+        eligible = np.ones(n, dtype=bool)
+    # Two-sided normal quantile for the given confidence level (scipy is
+    # only imported once a metric needs it)
+    from scipy.special import ndtri
+    z = float(ndtri(1 - (1 - confidence) / 2))
+    # Visit pivots in a random order, without replacement
+    order = np.random.default_rng(seed).permutation(n)
+    limit = n if pivots is None else min(pivots, n)
+    # Sums of the dependencies (and their squares) over all pivots
+    total = np.zeros(n)
+    squares = np.zeros(n)
+    sampled = 0
+    separated = False
+    # Time by which sampling must stop (if there is a budget), and the total
+    # time spent on the pivots so far
+    stop = None if budget is None else start + budget
+    spent = 0.0
+    out_of_time = False
+
+    while sampled < limit and not out_of_time:
+        # Process a batch of pivots between checks of the ranking
+        for source in order[sampled:min(sampled + PIVOT_BATCH, limit)]:
+            # Do not start a pivot which is not expected to finish in time
+            now = time.perf_counter()
+            if stop is not None and \
+                    now + (spent / sampled if sampled else 0) >= stop:
+                out_of_time = True
+                break
+            delta = _dependencies(graph, source, stop)
+            if delta is None:
+                out_of_time = True
+                break
+            spent += time.perf_counter() - now
+            total += delta
+            squares += delta * delta
+            sampled += 1
+        # Stop once the ranking is settled (which takes at least two pivots,
+        # since one pivot gives no estimate of the variance)
+        estimate, error = _estimate(total, squares, sampled, n, z)
+        separated = sampled > 1 and _separated(estimate, error, eligible,
+                                               count)
+        if separated:
+            break
+
+    estimate, error = _estimate(total, squares, sampled, n, z)
+    top = _top(estimate, eligible, count)
+    report = {
+        "pivots": sampled,
+        "nodes": n,
+        "exact": sampled == n,
+        "confidence": confidence,
+        "separated": bool(separated) or sampled == n,
+        # Whether the budget ran out before the pivot limit was reached
+        "truncated": not separated and sampled < limit,
+        "seconds": time.perf_counter() - start,
+        "top": [(graph.ids[i], float(estimate[i]), float(error[i]))
+                for i in top]
+    }
+    return estimate, error, report
+
+def closeness(graph, count=None, eligible=None, words=SOURCE_WORDS,
+              deadline=None, stats=None, two_hop=None, limit=None):
+    # Computes closeness centrality (as networkx does, with the Wasserman &
+    # Faust correction) of the eligible nodes, with breadth-first searches
+    # from 64 * words sources at once: each node keeps a bitset of the sources
+    # which have reached it, and a BFS level is a bitwise OR over adjacencies.
+    # If count is given, sources which provably cannot rank in the top count
+    # are abandoned early, or never searched if their closeness bound (see
+    # _closeness_bound, which uses the given two_hop_reach, or computes it)
+    # is already below the top count. If a deadline (a time.perf_counter()
+    # value) is given, no more sources are searched once it has passed (and
+    # the batch being searched is abandoned), so only the sources with the
+    # highest bounds are computed. If limit is given, at most that many
+    # sources (again, those with the highest bounds) are searched, which is
+    # approximate. Returns the closeness of each node, and a mask of the
+    # nodes whose closeness was computed (not abandoned, skipped, ineligible
+    # or cut off). If stats is given, it receives the number of sources
+    # searched, the number skipped by their bound, and whether the deadline
+    # cut them off.
+    graph = graph.undirected
+    n = len(graph)
+    if eligible is None:
+        eligible = np.ones(n, dtype=bool)
+    # Size of each node's connected component, which it reaches entirely
+    # (scipy is only imported once a metric needs it)
+    import scipy.sparse.csgraph
+    _, component = scipy.sparse.csgraph.connected_components(
+        graph.adjacency, directed=False)
+    reach = np.bincount(component)[component]
+    if two_hop is None:
+        two_hop = two_hop_reach(graph)
+    bound = _closeness_bound(graph, reach, two_hop)
+    # Search from the nodes with the highest bounds first, so that the top
+    # count threshold rises quickly, and the rest can be skipped once their
+    # bounds fall below it
+    sources = np.flatnonzero(eligible)
+    sources = sources[np.argsort(-bound[sources], kind="stable")]
+    if limit is not None:
+        sources = sources[:limit]
+    scores = np.zeros(n)
+    computed = np.zeros(n, dtype=bool)
+    # Closeness of the count-th best source so far
+    threshold = 0.0
+    # First adjacency of each node (the adjacencies are followed by an extra
+    # all-zero row, so that trailing empty adjacency lists are in range)
+    starts = graph.offsets[:-1]
+    width = 64 * words
+    searched = 0
+    truncated = False
+
+    for first in range(0, len(sources), width):
+        # Skip the sources which cannot reach the threshold (since the
+        # sources are sorted by their bounds, this is every remaining source
+        # once the first is skipped)
+        batch = sources[first:first + width]
+        batch = batch[bound[batch] >= threshold]
+        if len(batch) == 0:
+            break
+        if deadline is not None and time.perf_counter() >= deadline:
+            truncated = True
+            break
+        total, alive = _bfs_bitsets(graph, batch, reach[batch], starts, words,
+                                    threshold, deadline)
+        # A batch cut off by the deadline is discarded
+        if alive is None:
+            truncated = True
+            break
+        searched += len(batch)
+        # Closeness of every source which was searched completely
+        batch = batch[alive]
+        found = reach[batch] - 1.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rank = np.where(total[alive] > 0,
+                            found / total[alive] * found / max(n - 1, 1), 0.0)
+        scores[batch] = rank
+        computed[batch] = True
+        # Raise the threshold to the count-th best closeness so far
+        if count is not None and computed.sum() >= count:
+            threshold = np.partition(scores[computed], -count)[-count]
+    if stats is not None:
+        stats["searched"] = searched
+        stats["sources"] = len(sources)
+        stats["skipped"] = 0 if truncated else len(sources) - searched
+        stats["truncated"] = truncated
+    return scores, computed
+
+def core_numbers(graph):
+    # k-core number of every node of the undirected graph: the largest k for
+    # which the node is in a subgraph whose nodes all have degree k or more
+    graph = graph.undirected
+    return interface.core_numbers(
+        np.ascontiguousarray(graph.offsets, dtype=np.int64),
+        np.ascontiguousarray(graph.neighbors, dtype=np.int32))
+
+def two_hop_reach(graph):
+    # Upper bound on the number of other nodes within two hops of every node
+    # of the undirected graph: each neighbor reaches at most its degree - 1
+    # nodes besides this one, so the bound is the sum of the neighbors'
+    # degrees
+    graph = graph.undirected
+    return graph.adjacency @ graph.degree
+
+def _closeness_bound(graph, reach, two_hop):
+    # Upper bound on the closeness of every node (given the size of its
+    # component & its two_hop_reach), from the least total distance it could
+    # have: its neighbors at distance 1, as many of the rest as its 2-hop
+    # bound allows at distance 2, and the remainder at distance 3
+    others = reach - 1
+    near = np.minimum(graph.degree, others)
+    second = np.clip(two_hop - near, 0, others - near)
+    least = near + 2 * second + 3 * (others - near - second)
+    # Computed exactly as the closeness itself is, so that a node whose
+    # bound is tight never has a bound below its closeness
+    found = others.astype(np.float64)
+    n = len(graph)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(least > 0, found / least * found / max(n - 1, 1), 0.0)
+
+def iterated_degree(graph, generations):
+    # Counts the walks of length 1 to generations from every node (following
+    # duplicate adjacencies once per duplicate), as the sum of the products
+    # A·1, A²·1, ... of the adjacency matrix A. Counts are exact: they are
+    # int64 until they could overflow, and Python integers after that.
+    walks = np.ones(len(graph), dtype=np.int64)
+    total = np.zeros(len(graph), dtype=np.int64)
+    # Largest factor by which a product can grow the walk counts
+    growth = int(graph.degree.max()) if len(graph) else 0
+    for i in range(generations):
+        if walks.dtype != object and \
+                (int(walks.max()) * growth >= 2 ** 62 or
+                 int(total.max()) >= 2 ** 62):
+            walks = walks.astype(object)
+            total = total.astype(object)
+        if walks.dtype == object:
+            # Sparse products do not support Python integers, so sum each
+            # adjacency list (with an extra zero, for trailing empty lists)
+            gathered = np.append(walks[graph.neighbors], 0)
+            walks = np.add.reduceat(gathered, graph.offsets[:-1])
+            walks[graph.degree == 0] = 0
+        else:
+            walks = graph.adjacency @ walks
+        total += walks
+    return total
+
+def _bfs_bitsets(graph, sources, reach, starts, words, threshold,
+                 deadline=None):
+    # Total distance from each source to the nodes it reaches, and a mask of
+    # the sources not abandoned (or None for the mask, if the search would
+    # not finish by the deadline: a level is not started unless the time the
+    # last level took still fits)
+    n = len(graph)
+    width = len(sources)
+    # Bit j of word w in a node's bitset stands for source 64 * w + j
+    frontier = np.zeros((n + 1, words), dtype=np.uint64)
+    bits = np.arange(width)
+    frontier[sources, bits // 64] |= np.uint64(1) << (bits % 64).astype(
+        np.uint64)
+    visited = frontier[:n].copy()
+    # Sum of the distances to, and number of, the nodes reached by each source
+    total = np.zeros(width)
+    reached = np.ones(width)
+    # Mask of the sources which are still being searched
+    alive = np.ones(width, dtype=bool)
+    depth = 0
+
+    # Time taken by the last level
+    level = 0.0
+
+    while True:
+        now = time.perf_counter()
+        if deadline is not None and now + level >= deadline:
+            return total, None
+        depth += 1
+        # Sources which reach each node for the first time at this depth
+        gathered = frontier[np.append(graph.neighbors, n)]
+        found = np.bitwise_or.reduceat(gathered, starts, axis=0)
+        # Empty adjacency lists reduce to their first entry instead of zero
+        found[graph.degree == 0] = 0
+        found &= ~visited
+        found &= _mask(alive, words)
+        visited |= found
+        active = np.flatnonzero(found.any(axis=1))
+        if len(active) == 0:
+            break
+        # Count the newly reached nodes of each source
+        counts = np.unpackbits(found[active].view(np.uint8), axis=1,
+                               bitorder="little").sum(axis=0)[:width]
+        total += depth * counts
+        reached += counts
+        frontier[:n] = 0
+        frontier[active] = found[active]
+        # Abandon sources whose closeness is bounded below the threshold:
+        # every node still unreached is at least one level deeper
+        if threshold > 0:
+            bound = total + (depth + 1) * (reach - reached)
+            found_all = reach - 1.0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                best = np.where(bound > 0,
+                                found_all * found_all / bound / max(n - 1, 1),
+                                0.0)
+            alive &= best >= threshold
+        level = time.perf_counter() - now
+    return total, alive
+
+def _mask(alive, words):
+    # Bitset words with the bits of the live sources set
+    padded = np.zeros(64 * words, dtype=bool)
+    padded[:len(alive)] = alive
+    return np.packbits(padded, bitorder="little").view(np.uint64)
+
+def _estimate(total, squares, sampled, n, z):
+    # Without any pivots, nothing is known about any node
+    if sampled == 0:
+        return np.zeros(n), np.full(n, np.inf)
+    # Scale of networkx's normalized betweenness (ordered pairs of nodes)
+    scale = 1 / ((n - 1) * (n - 2)) if n > 2 else 0
+    mean = total / sampled
+    # Sample variance of each node's dependency on a random pivot, with a
+    # finite population correction for sampling without replacement
+    variance = np.maximum(squares / sampled - mean * mean, 0)
+    if sampled > 1:
+        variance *= sampled / (sampled - 1)
+    variance *= 1 - sampled / n
+    # Every pivot is a uniform sample of the n sources
+    estimate = mean * n * scale
+    error = z * np.sqrt(variance / sampled) * n * scale
+    return estimate, error
+
+def _top(estimate, eligible, count):
+    # Indices of the count highest-ranked eligible nodes, highest first
+    candidates = np.flatnonzero(eligible)
+    ranked = candidates[np.argsort(-estimate[candidates], kind="stable")]
+    return ranked[:count]
+
+def _separated(estimate, error, eligible, count):
+    # Check whether the confidence intervals of the top count eligible nodes
+    # lie above those of every other eligible node
+    top = _top(estimate, eligible, count)
+    rest = eligible.copy()
+    rest[top] = False
+    if len(top) == 0 or not rest.any():
+        return True
+    return (estimate[top] - error[top]).min() > \
+        (estimate[rest] + error[rest]).max()
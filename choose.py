@@ -1,25 +1,115 @@
 #!/usr/bin/env python3
 
 import argparse
-import json
+import os
 import sys
+import time
 
-import seeds
+import instrument
+import metrics
+import server
 
-def parse_data(graph):
-    # Open the given adjacency list file
-    with open(graph, "r") as f:
-        # Parse the JSON
-        data = json.load(f)
-        # Cast nodes & neighbors to int's
-        data = {int(k): [int(n) for n in v] for k, v in data.items()}
-    return data
+def parse_data(path, cache=True, cache_dir=None):
+    import graph
+    # If caching is disabled, parse the adjacency list file directly
+    if not cache:
+        return graph.load_json(path)
+    # Otherwise, memory-map its compiled form (compiling it if needed)
+    return graph.load_cached(path, cache_dir)
+
+def positive_int(text):
+    # Parse a count which must be at least 1
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(
+            "must be at least 1, not {}".format(text))
+    return value
+
+def positive_float(text):
+    # Parse a number of seconds which must be more than 0
+    value = float(text)
+    if not value > 0:
+        raise argparse.ArgumentTypeError(
+            "must be more than 0, not {}".format(text))
+    return value
+
+def factor(text):
+    # Parse a multiple of the number of seeds, which must be at least 1
+    value = float(text)
+    if not value >= 1:
+        raise argparse.ArgumentTypeError(
+            "must be at least 1, not {}".format(text))
+    return value
+
+def report_rankings(reports):
+    # If betweenness centrality was estimated
+    if metrics.BETWEEN in reports:
+        report = reports[metrics.BETWEEN]
+        # Summarize the sampling, and whether the top nodes are settled
+        sys.stderr.write(
+            "{}: estimated from {} of {} pivots in {:.2f}s; top {} {} at "
+            "{:.0%} confidence\n".format(
+                metrics.BETWEEN, report["pivots"], report["nodes"],
+                report["seconds"], len(report["top"]),
+                "separated" if report["separated"] else "not separated",
+                report["confidence"]))
+        # Print the confidence interval of each top node
+        for node, rank, error in report["top"]:
+            sys.stderr.write("  {} {:.6g} +/- {:.2g}\n".format(node, rank,
+                                                               error))
+
+    # If seeds were selected greedily
+    if metrics.GREEDY in reports:
+        report = reports[metrics.GREEDY]
+        # Summarize how many simulations the lazy evaluation needed
+        sys.stderr.write(
+            "{}: {} evaluations ({} games) of {} candidates; margin {:.1f}\n"
+            .format(metrics.GREEDY, report["evaluations"], report["games"],
+                    report["candidates"], report["margin"]))
+
+def report_progress(progress, filled):
+    # Report which metrics finished before the deadline, and which were
+    # truncated or skipped (and how many of their seeds were filled in with
+    # the highest degree nodes)
+    for metric in metrics.COST_ORDER:
+        if metric in progress:
+            sys.stderr.write("{}: {}{}\n".format(
+                metric, progress[metric],
+                "; {} seeds chosen by degree".format(filled[metric])
+                if metric in filled else ""))
+
+def select(parser, parsed, kwargs, start):
+    # The graph & metric modules are only imported when seeds are chosen
+    # locally, so that requests to a server start quickly
+    import context
+    import seeds
+    # Load the given adjacency list
+    with instrument.span("parse_data"):
+        data = parse_data(parsed.graph, parsed.cache, parsed.cache_dir)
+    # Check that every opponent seed is in the graph
+    for node in parsed.opponents or []:
+        if node not in data:
+            parser.error("opponent seed {} is not in the graph".format(node))
+    # Share the converted graph & its rankings between metrics, and (unless
+    # caching is disabled) with future runs on the same graph
+    kwargs["context"] = context.GraphContext(
+        data, context.cache_location(parsed.graph, parsed.cache_dir)
+        if parsed.cache else None)
+    if parsed.deadline is not None:
+        kwargs["deadline"] = start + parsed.deadline
+    # Initialize the seed selector
+    with instrument.span("generate"):
+        gen = seeds.SeedSelector(data, **kwargs)
+    return gen.reports, gen.progress, gen.filled, \
+        [gen.choose() for i in range(parsed.trials)]
 
 def main():
+    # Time at which this run started, from which the deadline is measured
+    start = time.perf_counter()
     parser = argparse.ArgumentParser(
         description="Select seed nodes for a given graph, according to various"
                     " centrality & influence metrics")
-    metrics = parser.add_argument_group("metrics",
+    options = parser.add_argument_group("metrics",
         "These options control how many seeds are selected using each metric. "
         " By default, no seeds are selected.")
     parser.add_argument("graph", metavar="GRAPH", 
@@ -33,44 +123,142 @@ def main():
                         help="The proportion of extra nodes which are kept, in"
                              " order to randomize which of the top seeds are "
                              "chosen")
-    metrics.add_argument("-b", "--" + seeds.BETWEEN, dest=seeds.BETWEEN,
+    parser.add_argument("--cache-dir", metavar="DIR", default=None,
+                        help="The directory in which compiled graphs & "
+                             "metric rankings are stored (by default, next "
+                             "to the graph file)")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="Parse the graph file without using or writing "
+                             "a compiled graph or stored metric rankings")
+    options.add_argument("-b", "--" + metrics.BETWEEN, dest=metrics.BETWEEN,
                          type=int, default=0,
                          help="The number of nodes to select by maximum "
                               "betweenness centrality")
-    metrics.add_argument("-c", "--" + seeds.CLOSE, dest=seeds.CLOSE, type=int,
-                         default=0,
+    options.add_argument("--between-pivots", metavar="PIVOTS",
+                         type=positive_int, default=None,
+                         help="Estimate betweenness centrality from at most "
+                              "this many sampled pivot nodes, instead of "
+                              "computing it exactly")
+    options.add_argument("--between-budget", metavar="SECONDS",
+                         type=positive_float, default=None,
+                         help="Estimate betweenness centrality from as many "
+                              "sampled pivot nodes as fit in this many "
+                              "seconds, instead of computing it exactly")
+    options.add_argument("-c", "--" + metrics.CLOSE, dest=metrics.CLOSE,
+                         type=int, default=0,
                          help="The number of seeds to select by maximum "
                               "closeness centrality")
-    metrics.add_argument("-D", "--" + seeds.DEGREE, dest=seeds.DEGREE,
+    options.add_argument("-D", "--" + metrics.DEGREE, dest=metrics.DEGREE,
                          type=int, default=0,
                          help="The number of seeds to select by maximum "
                               "degree")
-    metrics.add_argument("-d", "--" + seeds.DISCOUNT, dest=seeds.DISCOUNT,
+    options.add_argument("-d", "--" + metrics.DISCOUNT, dest=metrics.DISCOUNT,
                          type=int, default=0,
                          help="The number of seeds to select using the degree"
                               " discount heuristic")
-    metrics.add_argument("-i", "--" + seeds.ITERATED, dest=seeds.ITERATED,
+    options.add_argument("-i", "--" + metrics.ITERATED, dest=metrics.ITERATED,
                          type=int, default=0,
                          help="The number of seeds to select by maximum "
                               "iterated degree")
+    options.add_argument("-g", "--" + metrics.GREEDY, dest=metrics.GREEDY,
+                         type=int, default=0,
+                         help="The number of seeds to select greedily by "
+                              "simulated gain against the opponent seeds")
+    options.add_argument("--opponents", metavar="NODE", type=int, nargs="+",
+                         default=None,
+                         help="The opponent seeds which greedy selection "
+                              "plays against (by default, as many of the "
+                              "highest degree nodes as seeds are selected)")
+    options.add_argument("--greedy-games", metavar="GAMES", type=positive_int,
+                         default=10,
+                         help="The number of games simulated to evaluate each "
+                              "greedy candidate")
+    options.add_argument("--greedy-candidates", metavar="NODES",
+                         type=positive_int, default=None,
+                         help="The number of candidates for greedy selection "
+                              "taken from each of degree & iterated degree")
+    options.add_argument("--prune", metavar="FACTOR", type=factor,
+                         default=None,
+                         help="Only evaluate this many times as many nodes as"
+                              " are selected with closeness centrality & "
+                              "estimated betweenness centrality (those ranked"
+                              " highest by k-core number & closeness bound), "
+                              "which is approximate (by default, only nodes "
+                              "which provably cannot be selected are "
+                              "skipped); exact betweenness centrality cannot "
+                              "be pruned")
+    parser.add_argument("--deadline", metavar="SECONDS", type=float,
+                        default=None,
+                        help="Choose seeds within this many seconds of "
+                             "starting, running the cheapest metrics first "
+                             "and cutting the expensive ones short (by "
+                             "default, every metric runs to completion)")
+    parser.add_argument("--instrument", action="store_true",
+                        help="Report the time spent in each phase to stderr "
+                             "(also enabled by setting the {} environment "
+                             "variable)".format(instrument.ENVIRONMENT))
+    parser.add_argument("--server", metavar="SOCKET", nargs="?",
+                        const=server.SOCKET,
+                        default=os.environ.get(server.ENVIRONMENT),
+                        help="Send the request to a running server.py, which "
+                             "keeps graphs & rankings in memory, listening on"
+                             " this socket (by default, {}; also enabled by "
+                             "setting the {} environment variable)".format(
+                                 server.SOCKET, server.ENVIRONMENT))
     parsed = parser.parse_args()
-    # Load the given adjacency list
-    data = parse_data(parsed.graph)
+    if parsed.prune is not None and parsed.between > 0 and \
+            parsed.between_pivots is None and \
+            parsed.between_budget is None and parsed.deadline is None:
+        parser.error("--prune needs --between-pivots, --between-budget or "
+                     "--deadline to estimate betweenness centrality")
+    if parsed.instrument:
+        instrument.enable()
     # Initialize dictionary of keyword arguments for SeedSelector constructor
     kwargs = {}
     # For each metric
-    for metric in seeds.SeedSelector.order:
+    for metric in metrics.ORDER:
         # Get the value (if any; defaults to 0) that was given by the user
         value = getattr(parsed, metric)
         # Map the metric label to its given value
         kwargs[metric] = value
     kwargs["entropy"] = parsed.entropy
-    # Initialize the seed selector
-    gen = seeds.SeedSelector(data, **kwargs)
+    kwargs["between_pivots"] = parsed.between_pivots
+    kwargs["between_budget"] = parsed.between_budget
+    kwargs["opponents"] = parsed.opponents
+    kwargs["greedy_games"] = parsed.greedy_games
+    kwargs["greedy_candidates"] = parsed.greedy_candidates
+    kwargs["prune"] = parsed.prune
+
+    # If a server is running, have it choose the seeds (giving it whatever
+    # remains of the deadline)
+    if parsed.server is not None:
+        message = {"graph": os.path.abspath(parsed.graph), "kwargs": kwargs,
+                   "trials": parsed.trials, "deadline": None}
+        if parsed.deadline is not None:
+            message["deadline"] = \
+                max(start + parsed.deadline - time.perf_counter(), 0)
+        try:
+            response = server.request(parsed.server, message)
+        except (OSError, RuntimeError) as e:
+            parser.error("server {}: {}".format(parsed.server, e))
+        reports = response["reports"]
+        progress = response["progress"]
+        filled = response["filled"]
+        chosen = response["seeds"]
+    # Otherwise, choose them here
+    else:
+        reports, progress, filled, chosen = select(parser, parsed, kwargs,
+                                                   start)
+    # Report on any approximate rankings, and on the deadline
+    report_rankings(reports)
+    report_progress(progress, filled)
     # Print as many (possibly)
-    for i in range(parsed.trials):
-        sys.stdout.write("".join("{}\n".format(s) for s in gen.choose()))
+    for seeds in chosen:
+        sys.stdout.write("".join("{}\n".format(s) for s in seeds))
     sys.stdout.flush()
+    # Report the time spent in each phase
+    if instrument.enabled:
+        instrument.report()
 
 if __name__ == "__main__":
     main()
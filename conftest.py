@@ -0,0 +1,24 @@
+import random
+
+import pytest
+
+def random_graph(n, p, seed):
+    # Random undirected adjacency list, with some asymmetric & duplicate
+    # adjacencies and a self loop, as real graph files have
+    r = random.Random(seed)
+    adj = {node: [] for node in range(n)}
+    for node in range(n):
+        for other in range(node + 1, n):
+            if r.random() < p:
+                adj[node].append(other)
+                adj[other].append(node)
+    for node in range(n // 10):
+        adj[node].append(r.randrange(n))
+    adj[0].append(0)
+    return adj
+
+@pytest.fixture(params=[(60, 0.08, 0), (120, 0.04, 1), (200, 0.02, 2)],
+                ids=["small", "medium", "sparse"])
+def adj(request):
+    # Each test taking adj runs on every random graph
+    return random_graph(*request.param)
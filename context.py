@@ -0,0 +1,191 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from graph import CSRGraph, as_csr
+import centrality
+import instrument
+
+# Version of the stored rankings, which must change whenever a metric's
+# results change
+FORMAT_VERSION = 1
+
+def to_networkx(graph):
+    # networkx is slow to import, so it is only imported once it is needed
+    import networkx as nx
+    # networkx can convert adjacency list dictionaries directly
+    if not isinstance(graph, CSRGraph):
+        return nx.Graph(graph)
+    # Otherwise, add the nodes & edges of the CSR graph, as networkx would
+    G = nx.Graph()
+    G.add_nodes_from(graph.id_list())
+    ids = np.asarray(graph.ids)
+    G.add_edges_from(zip(ids[graph.rows].tolist(),
+                         ids[graph.neighbors].tolist()))
+    return G
+
+def cache_location(path, cache_dir=None):
+    # By default, rankings are stored next to their graph file
+    if cache_dir is None:
+        return path + ".rankings"
+    # Otherwise, every graph shares one directory (rankings are keyed by the
+    # graph's contents, so they cannot collide)
+    return os.path.join(cache_dir, "rankings")
+
+class GraphContext:
+
+    def __init__(self, graph, cache_dir=None):
+        # Convert the graph once, for every metric
+        self.graph = as_csr(graph)
+        # Directory in which rankings are stored (if None, they are only kept
+        # in memory)
+        self.cache_dir = cache_dir
+        # Maps ranking names -> dicts of their arrays
+        self._rankings = {}
+        self._networkx = None
+        self._digest = None
+
+    @property
+    def networkx(self):
+        # networkx graph, built the first time it is needed
+        if self._networkx is None:
+            with instrument.span("networkx"):
+                self._networkx = to_networkx(self.graph)
+        return self._networkx
+
+    @property
+    def digest(self):
+        # Hash of the graph's contents, which identifies its rankings
+        if self._digest is None:
+            h = hashlib.sha1()
+            for array, dtype in [(self.graph.ids, np.int64),
+                                 (self.graph.offsets, np.int64),
+                                 (self.graph.neighbors, np.int32)]:
+                array = np.ascontiguousarray(array, dtype=dtype)
+                h.update(str(array.shape).encode())
+                h.update(array.data)
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def _location(self, name):
+        return os.path.join(self.cache_dir, self.digest, name + ".npz")
+
+    def stored(self, name):
+        # Return the arrays of the named ranking, if it has been computed (by
+        # this or an earlier run), and None otherwise
+        if name in self._rankings:
+            return self._rankings[name]
+        if self.cache_dir is None:
+            return None
+        try:
+            with np.load(self._location(name)) as f:
+                arrays = {key: f[key] for key in f.files}
+        except (OSError, ValueError):
+            # The ranking has not been stored, or is unreadable
+            return None
+        # Ignore rankings stored by other versions, or for other graphs (whose
+        # per-node arrays are the wrong length)
+        if arrays.pop("version", None) != FORMAT_VERSION or \
+                any(array.ndim > 0 and len(array) != len(self.graph)
+                    for array in arrays.values()):
+            return None
+        self._rankings[name] = arrays
+        return arrays
+
+    def store(self, name, **arrays):
+        # Keep the arrays of the named ranking, and store them for future runs
+        self._rankings[name] = arrays
+        if self.cache_dir is None:
+            return
+        location = self._location(name)
+        try:
+            os.makedirs(os.path.dirname(location), exist_ok=True)
+            # Write into a temporary file first, so that concurrent or
+            # interrupted runs never see a partially written ranking
+            fd, staging = tempfile.mkstemp(dir=os.path.dirname(location))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, version=FORMAT_VERSION, **arrays)
+                os.replace(staging, location)
+            finally:
+                if os.path.exists(staging):
+                    os.remove(staging)
+        except OSError:
+            # Storing rankings is only an optimization, so failures are not
+            # fatal
+            pass
+
+    def betweenness(self):
+        # Exact betweenness centrality of every node
+        arrays = self.stored("betweenness")
+        if arrays is None:
+            import networkx as nx
+            exact = nx.betweenness_centrality(self.networkx)
+            arrays = {"rank": np.array(
+                [exact[node] for node in self.graph.id_list()],
+                dtype=np.float64)}
+            self.store("betweenness", **arrays)
+        return arrays["rank"]
+
+    def candidates(self):
+        # Bounds which the expensive metrics share, to skip the nodes which
+        # cannot rank highly: the degree & 2-hop reach bound of every node of
+        # the undirected graph
+        arrays = self.stored("candidates")
+        if arrays is None:
+            with instrument.span("candidates"):
+                graph = self.graph.undirected
+                arrays = {"degree": np.asarray(graph.degree),
+                          "reach": centrality.two_hop_reach(graph)}
+            self.store("candidates", **arrays)
+        return arrays
+
+    def cores(self):
+        # k-core number of every node of the undirected graph, which ranks
+        # the candidates of the expensive metrics when pruning
+        arrays = self.stored("cores")
+        if arrays is None:
+            with instrument.span("cores"):
+                arrays = {"rank": centrality.core_numbers(self.graph)}
+            self.store("cores", **arrays)
+        return arrays["rank"]
+
+    def closeness(self, count=None, deadline=None, stats=None,
+                  eligible=None, limit=None):
+        # Closeness centrality of every node which could rank in the top
+        # count, and a mask of the nodes whose closeness was computed. A
+        # stored ranking is reused if it was computed for at least as many
+        # nodes. If the ranking is computed, the deadline, stats, eligible
+        # nodes & source limit are passed on (see centrality.closeness), and
+        # a ranking cut off by the deadline or limit is not kept.
+        arrays = self.stored("closeness")
+        # The stored count is -1 if every node was computed
+        if arrays is None or (int(arrays["count"]) >= 0 and
+                              (count is None or int(arrays["count"]) < count)):
+            stats = {} if stats is None else stats
+            rank, computed = centrality.closeness(
+                self.graph, count, eligible if limit is not None else None,
+                deadline=deadline, stats=stats,
+                two_hop=self.candidates()["reach"], limit=limit)
+            if stats["truncated"] or limit is not None:
+                return rank, computed
+            arrays = {"rank": rank, "computed": computed,
+                      "count": np.int64(-1 if count is None else count)}
+            self.store("closeness", **arrays)
+        return arrays["rank"], arrays["computed"]
+
+    def iterated_degree(self, generations):
+        # Number of walks of up to the given length from every node
+        name = "iterated-{}".format(generations)
+        arrays = self.stored(name)
+        if arrays is None:
+            # Counts which exceed int64 are kept as (inexact) floats, since
+            # rankings are compared as floats anyway
+            walks = centrality.iterated_degree(self.graph, generations)
+            if walks.dtype == object:
+                walks = walks.astype(np.float64)
+            arrays = {"rank": walks}
+            self.store(name, **arrays)
+        return arrays["rank"]
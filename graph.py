@@ -0,0 +1,403 @@
+from array import array
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+# Version of the compiled graph format, stored with each compiled graph
+FORMAT_VERSION = 1
+# Arrays stored in a compiled graph directory
+ARRAYS = ["offsets", "neighbors", "ids"]
+# Number of bytes read at a time by load_json
+CHUNK_SIZE = 1 << 20
+
+# One node of a JSON adjacency list, as a (quoted) node ID and the body of its
+# list of (optionally quoted) neighbor IDs
+ENTRY = re.compile(rb'"(-?\d+)"\s*:\s*\[([^\]]*)\]')
+# Text allowed between nodes, and after the last node
+SEPARATOR = re.compile(rb'[\s{,]*')
+END = re.compile(rb'\s*}\s*')
+# The whole text of an adjacency list with no nodes
+EMPTY = re.compile(rb'\s*{\s*}\s*')
+# Node IDs are stored as 32-bit integers
+ID_RANGE = np.iinfo(np.int32)
+# Translation table which turns a list of neighbor IDs into whitespace
+# separated numbers (quotes are deleted)
+UNQUOTE = bytes.maketrans(b",", b" ")
+
+class CSRGraph(Mapping):
+
+    def __init__(self, offsets, neighbors, ids):
+        # Index into neighbors where each node's adjacency list starts; the
+        # neighbors of node i are neighbors[offsets[i]:offsets[i + 1]]
+        self.offsets = offsets
+        # Concatenated adjacency lists, stored as node indices (not IDs)
+        self.neighbors = neighbors
+        # Maps node index -> original node ID
+        self.ids = ids
+        # Lazily computed attributes
+        self._index = None
+        self._degree = None
+        self._rows = None
+        self._reverse = None
+        self._adjacency = None
+        self._undirected = None
+
+    @classmethod
+    def from_adj_list(cls, adj_list):
+        # Relabel node IDs as consecutive indices, in adjacency list order
+        ids = list(adj_list.keys())
+        index = {node: i for i, node in enumerate(ids)}
+        # Count the adjacencies of each node
+        degree = np.fromiter((len(v) for v in adj_list.values()),
+                             dtype=np.int64, count=len(ids))
+        # Offsets are the running total of node degrees
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(degree, out=offsets[1:])
+        # Relabel every neighbor (raises KeyError for unknown neighbors)
+        neighbors = np.fromiter(
+            (index[n] for adjacent in adj_list.values() for n in adjacent),
+            dtype=np.int32, count=int(offsets[-1]))
+        graph = cls(offsets, neighbors, ids)
+        graph._index = index
+        return graph
+
+    @classmethod
+    def load(cls, directory):
+        # Memory-map each array of a graph written by save
+        arrays = {name: np.load(os.path.join(directory, name + ".npy"),
+                                mmap_mode="r")
+                  for name in ARRAYS}
+        return cls(arrays["offsets"], arrays["neighbors"], arrays["ids"])
+
+    def save(self, directory):
+        # Write each array in NumPy's binary format, so it can be memory-mapped
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"offsets": self.offsets, "neighbors": self.neighbors,
+                  "ids": np.asarray(self.ids, dtype=np.int64)}
+        for name in ARRAYS:
+            np.save(os.path.join(directory, name + ".npy"), arrays[name])
+
+    def __len__(self):
+        # Return the number of nodes in the graph
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        # Iterate over node IDs, in index order
+        return iter(self.id_list())
+
+    def __contains__(self, node):
+        # Check whether a node ID is in the graph
+        return node in self.index
+
+    def __getitem__(self, node):
+        # Return the adjacency list of a node, as node IDs
+        i = self.index[node]
+        neighbors = self.neighbors[self.offsets[i]:self.offsets[i + 1]]
+        if isinstance(self.ids, np.ndarray):
+            return self.ids[neighbors].tolist()
+        return [self.ids[n] for n in neighbors]
+
+    def id_list(self):
+        # Return the node IDs as a list of Python objects
+        if isinstance(self.ids, np.ndarray):
+            return self.ids.tolist()
+        return list(self.ids)
+
+    @property
+    def index(self):
+        # Maps original node ID -> node index
+        if self._index is None:
+            self._index = {node: i for i, node in enumerate(self.id_list())}
+        return self._index
+
+    @property
+    def degree(self):
+        # Number of adjacencies (counting duplicates) of each node
+        if self._degree is None:
+            self._degree = np.diff(self.offsets)
+        return self._degree
+
+    @property
+    def rows(self):
+        # Index of the node owning each entry in neighbors
+        if self._rows is None:
+            self._rows = np.repeat(
+                np.arange(len(self), dtype=np.int64), self.degree)
+        return self._rows
+
+    @property
+    def adjacency(self):
+        # Sparse adjacency matrix, where entry (i, j) is the number of times j
+        # is listed as a neighbor of i
+        if self._adjacency is None:
+            # scipy is only imported once a metric needs it
+            import scipy.sparse
+            self._adjacency = scipy.sparse.csr_matrix(
+                (np.ones(len(self.neighbors), dtype=np.int32), self.neighbors,
+                 self.offsets), shape=(len(self), len(self)))
+        return self._adjacency
+
+    @property
+    def reverse(self):
+        # Graph with every adjacency reversed (node i lists the nodes having i
+        # as a neighbor)
+        if self._reverse is None:
+            # Sort adjacencies by neighbor, keeping the owning node of each
+            order = np.argsort(self.neighbors, kind="stable")
+            offsets = np.zeros(len(self) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.neighbors, minlength=len(self)),
+                      out=offsets[1:])
+            neighbors = self.rows[order].astype(np.int32)
+            self._reverse = CSRGraph(offsets, neighbors, self.ids)
+            self._reverse._index = self._index
+        return self._reverse
+
+    @property
+    def undirected(self):
+        # Simple undirected graph with the same edges (as networkx builds from
+        # an adjacency list): every adjacency is made symmetric, and duplicate
+        # adjacencies & self loops are dropped
+        if self._undirected is None:
+            n = len(self)
+            rows = np.concatenate([self.rows, self.neighbors])
+            columns = np.concatenate([self.neighbors, self.rows])
+            loops = rows == columns
+            # Sort & drop repeats, rather than np.unique (whose hash-based
+            # path is an order of magnitude slower on large edge lists)
+            edges = np.sort(rows[~loops] * n + columns[~loops])
+            edges = edges[np.append(True, edges[1:] != edges[:-1])
+                          [:len(edges)]]
+            offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(edges // n, minlength=n), out=offsets[1:])
+            neighbors = (edges % n).astype(np.int32)
+            self._undirected = CSRGraph(offsets, neighbors, self.ids)
+            self._undirected._index = self._index
+            self._undirected._undirected = self._undirected
+        return self._undirected
+
+    def select(self, nodes):
+        # Degrees of the selected nodes
+        degree = self.degree[nodes]
+        # Index of each selected node's first adjacency, repeated for each of
+        # its adjacencies and shifted so that an arange walks every list
+        starts = np.repeat(self.offsets[nodes] - np.cumsum(degree) + degree,
+                           degree)
+        entries = starts + np.arange(len(starts), dtype=np.int64)
+        # Position of the owning node in nodes, for each adjacency
+        rows = np.repeat(np.arange(len(nodes), dtype=np.int64), degree)
+        # Return the (row, neighbor) pairs of the selected sub-graph
+        return rows, self.neighbors[entries]
+
+    def share(self, reverse=False):
+        # Arrays needed to simulate on this graph (and its reverse, if needed)
+        arrays = {"offsets": self.offsets, "neighbors": self.neighbors,
+                  "rows": self.rows}
+        if reverse:
+            arrays["reverse_offsets"] = self.reverse.offsets
+            arrays["reverse_neighbors"] = self.reverse.neighbors
+        # Shared memory blocks, which must be kept open (and finally unlinked)
+        # by the caller while other processes are attached
+        blocks = []
+        # Maps array name -> (block name, shape, dtype), for attach
+        spec = {}
+        for name, values in arrays.items():
+            block = shared_memory.SharedMemory(create=True,
+                                               size=max(values.nbytes, 1))
+            blocks.append(block)
+            # Copy the array into the shared memory block
+            shared = np.ndarray(values.shape, values.dtype, buffer=block.buf)
+            shared[:] = values
+            spec[name] = (block.name, values.shape, values.dtype.str)
+        return blocks, spec
+
+    @classmethod
+    def attach(cls, spec):
+        # Shared memory blocks, which must outlive the returned graph
+        blocks = []
+        # Maps array name -> view of a shared memory block
+        arrays = {}
+        for name, (block_name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype, buffer=block.buf)
+        # Node IDs are not shared, so seeds must be given as node indices
+        graph = cls(arrays["offsets"], arrays["neighbors"], None)
+        graph._rows = arrays["rows"]
+        if "reverse_offsets" in arrays:
+            graph._reverse = cls(arrays["reverse_offsets"],
+                                 arrays["reverse_neighbors"], None)
+        return graph, blocks
+
+
+def as_csr(adj_list):
+    # Return the given graph as a CSRGraph, relabeling it if necessary
+    if isinstance(adj_list, CSRGraph):
+        return adj_list
+    return CSRGraph.from_adj_list(adj_list)
+
+def load_json(path, stats=None, chunk_size=CHUNK_SIZE):
+    # Parses a JSON adjacency list incrementally, with either quoted or
+    # unquoted neighbor IDs. If stats is given, its "peak_bytes" item is set
+    # to the peak size of the loader's buffers.
+
+    # Node IDs, their degrees, and their concatenated neighbor IDs, which are
+    # appended to as the file is read
+    ids = array("i")
+    degree = array("i")
+    neighbor_ids = array("i")
+    # Unparsed text at the end of the last chunk
+    pending = b""
+    # Largest number of bytes held by the buffers above
+    peak = 0
+
+    # Open the given adjacency list file
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            pending += chunk
+            position = 0
+            bodies = []
+            # For each complete node in the buffered text
+            for match in ENTRY.finditer(pending):
+                # Reject anything but separators between nodes
+                start = match.start()
+                if SEPARATOR.fullmatch(pending, position, start) is None:
+                    raise ValueError("Invalid adjacency list at byte {} of {}"
+                                     .format(f.tell() - len(pending) +
+                                             position, path))
+                node = int(match.group(1))
+                if not ID_RANGE.min <= node <= ID_RANGE.max:
+                    raise ValueError("Node ID {} is out of range in {}"
+                                     .format(node, path))
+                ids.append(node)
+                body = match.group(2)
+                degree.append(body.count(b",") + 1 if body.strip() else 0)
+                bodies.append(body)
+                position = match.end()
+            # Parse the neighbors of every node in this chunk at once (as
+            # 64-bit integers, so that out of range IDs are rejected rather
+            # than wrapped around)
+            text = b" ".join(bodies).translate(UNQUOTE, b'"')
+            # (NumPy parses blank text as a single 0, so nodes whose neighbor
+            # lists are all empty are not parsed)
+            numbers = np.fromstring(text, dtype=np.int64, sep=" ") \
+                if text.strip() else np.zeros(0, dtype=np.int64)
+            if len(numbers) != sum(degree[len(degree) - len(bodies):]):
+                raise ValueError("Invalid neighbor list in {}".format(path))
+            if len(numbers) and (numbers.min() < ID_RANGE.min or
+                                 numbers.max() > ID_RANGE.max):
+                raise ValueError("Neighbor ID out of range in {}"
+                                 .format(path))
+            neighbor_ids.frombytes(numbers.astype(np.int32).tobytes())
+            pending = pending[position:]
+            peak = max(peak, len(pending) + len(chunk) +
+                       (len(ids) + len(degree) + len(neighbor_ids)) *
+                       ids.itemsize)
+            if not chunk:
+                break
+    # An adjacency list with no nodes is also valid
+    if END.fullmatch(pending) is None and \
+            (len(ids) or EMPTY.fullmatch(pending) is None):
+        raise ValueError("Invalid adjacency list at the end of {}"
+                         .format(path))
+
+    # Offsets are the running total of node degrees
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(np.frombuffer(degree, dtype=np.int32), out=offsets[1:])
+    del degree
+    ids = np.frombuffer(ids, dtype=np.int32)
+    neighbor_ids = np.frombuffer(neighbor_ids, dtype=np.int32)
+    neighbors, lookup_bytes = relabel(ids, neighbor_ids)
+    peak = max(peak, offsets.nbytes + ids.nbytes + lookup_bytes +
+               2 * neighbors.nbytes + neighbor_ids.nbytes)
+    if stats is not None:
+        stats["peak_bytes"] = peak
+    return CSRGraph(offsets, neighbors, ids.astype(np.int64))
+
+def relabel(ids, neighbor_ids):
+    if len(ids) == 0:
+        if len(neighbor_ids):
+            raise KeyError(int(neighbor_ids[0]))
+        return np.zeros(0, dtype=np.int32), 0
+    low = int(ids.min())
+    high = int(ids.max())
+    # If the node IDs are dense enough, map them through a lookup table
+    if low >= 0 and high < 4 * len(ids):
+        table = np.full(high + 1, -1, dtype=np.int32)
+        table[ids] = np.arange(len(ids), dtype=np.int32)
+        valid = (neighbor_ids >= 0) & (neighbor_ids <= high)
+        neighbors = table[np.where(valid, neighbor_ids, 0)]
+        neighbors[~valid] = -1
+        unknown = neighbors < 0
+        lookup_bytes = table.nbytes
+    # Otherwise, binary search the sorted node IDs
+    else:
+        order = np.argsort(ids, kind="stable").astype(np.int32)
+        found = np.searchsorted(ids, neighbor_ids, sorter=order)
+        np.minimum(found, len(ids) - 1, out=found)
+        neighbors = order[found]
+        unknown = ids[neighbors] != neighbor_ids
+        lookup_bytes = order.nbytes + found.nbytes
+    if unknown.any():
+        raise KeyError(int(neighbor_ids[unknown.argmax()]))
+    # Return the neighbor indices, and the size of the lookup structure
+    return neighbors, lookup_bytes
+
+def cache_location(path, cache_dir=None):
+    # By default, compiled graphs are stored next to their source file
+    if cache_dir is None:
+        return path + ".csr"
+    # Otherwise, distinguish source files with the same name by their path
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(cache_dir, "{}-{}.csr".format(os.path.basename(path),
+                                                      digest[:12]))
+
+def load_cached(path, cache_dir=None, stats=None):
+    # Identify the source file by its size & modification time, which is much
+    # cheaper than hashing a large file on every run
+    stat = os.stat(path)
+    key = {"version": FORMAT_VERSION, "source": os.path.abspath(path),
+           "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    location = cache_location(path, cache_dir)
+    meta = os.path.join(location, "meta.json")
+
+    try:
+        # If the compiled graph is up to date
+        with open(meta, "r") as f:
+            if json.load(f) == key:
+                # Memory-map it, without any parsing
+                return CSRGraph.load(location)
+    except (OSError, ValueError):
+        # The graph has not been compiled, or its metadata is unreadable
+        pass
+
+    # Parse the source file, and compile it for future runs
+    graph = load_json(path, stats)
+    try:
+        save_cached(graph, location, key)
+    except OSError:
+        # Compilation is only an optimization, so failures are not fatal
+        pass
+    return graph
+
+def save_cached(graph, location, key):
+    parent = os.path.dirname(os.path.abspath(location))
+    os.makedirs(parent, exist_ok=True)
+    # Write into a temporary directory first, so that concurrent or
+    # interrupted runs never see a partially written graph
+    staging = tempfile.mkdtemp(dir=parent)
+    try:
+        graph.save(staging)
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump(key, f)
+        shutil.rmtree(location, ignore_errors=True)
+        os.replace(staging, location)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
@@ -0,0 +1,96 @@
+import time
+
+import numpy as np
+
+import interface
+import sim
+
+# Team names used in simulated games
+OURS = "ours"
+THEIRS = "theirs"
+# Number of candidate seed sets whose games are simulated together
+EVALUATION_BATCH = 32
+
+def _evaluate(graph, base, candidates, opponents, games, seed,
+              deadline=None):
+    # Average margin (our nodes minus their nodes) at the end of a game, for
+    # the base seeds plus each candidate (or just the base seeds, for None).
+    # Game i draws the same stopping point for every candidate (common random
+    # numbers), so differences between candidates are not sampling noise.
+    # If a deadline (a time.perf_counter() value) is given, no more batches
+    # are played once it has passed, so only a prefix of the candidates may
+    # be evaluated.
+    margins = []
+    for first in range(0, len(candidates), EVALUATION_BATCH):
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        all_mappings = []
+        rngs = []
+        for candidate in candidates[first:first + EVALUATION_BATCH]:
+            ours = base if candidate is None else base + [candidate]
+            for i in range(games):
+                all_mappings.append({OURS: ours, THEIRS: opponents})
+                rngs.append(sim.game_rng(seed, i))
+        # Play every game of the batch together, on the same graph arrays
+        # (with cycle detection, which ends games that oscillate forever)
+        results = sim.run_batch(graph, all_mappings, rngs, indexed=True,
+                                cycles=[])
+        margin = np.array([r[OURS] - r[THEIRS] for r in results],
+                          dtype=np.float64)
+        margins.extend(margin.reshape(-1, games).mean(axis=1).tolist())
+    return margins
+
+def celf(graph, count, candidates, opponents, base=(), games=10, seed=0,
+         deadline=None):
+    # Greedily chooses count of the candidate nodes (as node indices of
+    # graph), each maximizing the simulated margin gained by adding it to the
+    # base & previously chosen seeds, against the opponent seeds. Gains are
+    # evaluated lazily (CELF): a candidate is only re-simulated when its gain
+    # from an earlier round is still the largest, since gains rarely grow as
+    # seeds are added. Majority voting is not submodular, so this is a
+    # heuristic, as is greedy selection itself. If a deadline (a
+    # time.perf_counter() value) is given, no more simulations are started
+    # once it has passed, and fewer nodes may be chosen. Returns the chosen
+    # nodes, and a report on the number of simulated evaluations.
+    base = list(base)
+    opponents = list(opponents)
+    excluded = set(base)
+    candidates = [c for c in candidates if c not in excluded]
+    value = _evaluate(graph, base, [None], opponents, games, seed)[0]
+    # Indexed max heap of (gain, node) of the remaining candidates
+    heap = interface.indexed_heap()
+    # Maps node -> (gain, number of chosen seeds when it was evaluated)
+    gains = {}
+    margins = _evaluate(graph, base, candidates, opponents, games, seed,
+                        deadline)
+    for node, margin in zip(candidates, margins):
+        gains[node] = (margin - value, 0)
+        heap.insert(margin - value, node)
+    evaluations = len(margins) + 1
+    truncated = len(margins) < len(candidates)
+
+    chosen = []
+    while len(chosen) < count and heap.size() > 0:
+        node, _ = heap.peek_max()
+        gain, evaluated = gains[node]
+        # If the gain is up to date, no other candidate can gain more
+        if evaluated == len(chosen):
+            heap.get_max()
+            chosen.append(node)
+            base.append(node)
+            value += gain
+            continue
+        # Otherwise, re-simulate it (unless time has run out), and update its
+        # place in the heap
+        if deadline is not None and time.perf_counter() >= deadline:
+            truncated = True
+            break
+        gain = _evaluate(graph, base, [node], opponents, games, seed)[0] - \
+            value
+        gains[node] = (gain, len(chosen))
+        heap.insert(gain, node)
+        evaluations += 1
+
+    return chosen, {"candidates": len(candidates), "evaluations": evaluations,
+                    "games": games * evaluations, "margin": value,
+                    "truncated": truncated}
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+
+# Environment variable which enables instrumentation, if set to anything but
+# an empty string or "0"
+ENVIRONMENT = "PANDEMANIAC_INSTRUMENT"
+
+# Whether instrumentation is enabled
+enabled = os.environ.get(ENVIRONMENT, "") not in ["", "0"]
+# Stream which instrumentation is reported to
+stream = sys.stderr
+# Maps span names -> [number of times entered, total seconds]
+totals = {}
+
+def enable(output=None):
+    global enabled, stream
+    enabled = True
+    if output is not None:
+        stream = output
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    # Forget the totals of every span, such as between the requests of a
+    # long-running process
+    totals.clear()
+
+def record(name, seconds):
+    # Add one timing to the totals of the named span
+    total = totals.setdefault(name, [0, 0.0])
+    total[0] += 1
+    total[1] += seconds
+
+class Span:
+
+    __slots__ = ["name", "start"]
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+class NullSpan:
+
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+# The one span used while instrumentation is disabled, which does nothing
+NULL_SPAN = NullSpan()
+
+def span(name):
+    # Context manager which times its body as the named span (only while
+    # instrumentation is enabled; otherwise it costs one function call)
+    return Span(name) if enabled else NULL_SPAN
+
+def generation_callback(name):
+    # Callback for the per-generation hooks of the simulator, which reports
+    # each generation of the named simulation, or None while instrumentation
+    # is disabled (so the simulator does no extra work)
+    if not enabled:
+        return None
+
+    def callback(generation, changed, seconds):
+        record(name + "/generation", seconds)
+        stream.write("{} generation {}: {} nodes changed in {:.3f}ms\n"
+                     .format(name, generation, changed, seconds * 1000))
+
+    return callback
+
+def report():
+    # Write the totals of every span, in the order they were first entered
+    for name, (count, seconds) in totals.items():
+        stream.write("{:<32} {:>8} calls {:>10.3f}s\n".format(name, count,
+                                                              seconds))
+    stream.flush()
@@ -1,13 +1,23 @@
 cdef extern from "./rank.hpp":
     cdef cppclass Ranking:
         float rank
-        int ID
-        Ranking()
-        Ranking(float, int)
+        long long ID
+        Ranking() nogil
+        Ranking(float, long long) nogil
 
 cdef extern from "./minmaxheap.hpp" namespace "heap":
     cdef cppclass LimitedMaxHeap[T]:
         LimitedMaxHeap(int)
-        void insert(T)
+        void insert(T) nogil
+        T get_max() nogil
+        int size() nogil
+
+    cdef cppclass IndexedMaxHeap[T]:
+        IndexedMaxHeap()
+        bint contains(long long)
         T get_max()
-        int size()
\ No newline at end of file
+        void insert(T)
+        T peek_max()
+        void remove(long long)
+        int size()
+        void update(T)
\ No newline at end of file
@@ -1,5 +1,8 @@
+cimport cython
 cimport interface
 
+import numpy as np
+
 cdef class rank_heap:
 
     cdef interface.LimitedMaxHeap[interface.Ranking] *thisptr
@@ -9,13 +12,130 @@ cdef class rank_heap:
     def __dealloc__(self):
         del self.thisptr
 
-    def insert(self, float rank, int ID):
+    def insert(self, float rank, long long ID):
         cdef interface.Ranking new_rank = interface.Ranking(rank, ID)
         self.thisptr.insert(new_rank)
 
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def insert_many(self, const double[:] ranks, const long long[:] IDs):
+        cdef Py_ssize_t i
+        if ranks.shape[0] != IDs.shape[0]:
+            raise ValueError("ranks and IDs must have the same length")
+        with nogil:
+            for i in range(ranks.shape[0]):
+                self.thisptr.insert(interface.Ranking(ranks[i], IDs[i]))
+
     def get_max(self):
         cdef interface.Ranking maximum = self.thisptr.get_max()
         return maximum.ID, maximum.rank
 
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def drain(self, count=None):
+        cdef Py_ssize_t i, n = self.thisptr.size()
+        cdef interface.Ranking maximum
+        if count is not None:
+            n = max(0, min(n, count))
+        IDs = np.empty(n, dtype=np.int64)
+        ranks = np.empty(n, dtype=np.float64)
+        cdef long long[:] IDs_view = IDs
+        cdef double[:] ranks_view = ranks
+        with nogil:
+            for i in range(n):
+                maximum = self.thisptr.get_max()
+                IDs_view[i] = maximum.ID
+                ranks_view[i] = maximum.rank
+        return IDs, ranks
+
     def size(self):
-        return self.thisptr.size()
\ No newline at end of file
+        return self.thisptr.size()
+
+
+cdef class indexed_heap:
+
+    cdef interface.IndexedMaxHeap[interface.Ranking] *thisptr
+
+    def __cinit__(self):
+        self.thisptr = new interface.IndexedMaxHeap[interface.Ranking]()
+    def __dealloc__(self):
+        del self.thisptr
+
+    def __contains__(self, long long ID):
+        return self.thisptr.contains(ID)
+
+    def insert(self, float rank, long long ID):
+        cdef interface.Ranking new_rank = interface.Ranking(rank, ID)
+        self.thisptr.update(new_rank)
+
+    def get_max(self):
+        if self.thisptr.size() == 0:
+            raise IndexError("get_max from an empty heap")
+        cdef interface.Ranking maximum = self.thisptr.get_max()
+        return maximum.ID, maximum.rank
+
+    def peek_max(self):
+        if self.thisptr.size() == 0:
+            raise IndexError("peek_max from an empty heap")
+        cdef interface.Ranking maximum = self.thisptr.peek_max()
+        return maximum.ID, maximum.rank
+
+    def remove(self, long long ID):
+        self.thisptr.remove(ID)
+
+    def size(self):
+        return self.thisptr.size()
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def core_numbers(const long long[:] offsets, const int[:] neighbors):
+    # Bucket peeling (Batagelj & Zaversnik) of a simple undirected graph in
+    # CSR form, in O(nodes + edges): nodes are kept sorted by their current
+    # degree, with the start of each degree's bucket in start, and each node
+    # peeled in order moves its higher degree neighbors down one bucket
+    cdef Py_ssize_t n = offsets.shape[0] - 1
+    cdef Py_ssize_t i, j, u, v, w, position, top = 0
+    cdef long long d
+    core = np.diff(np.asarray(offsets))
+    cdef long long[:] degree = core
+    for i in range(n):
+        top = max(top, degree[i])
+    start = np.zeros(top + 2, dtype=np.int64)
+    order = np.empty(n, dtype=np.int64)
+    where = np.empty(n, dtype=np.int64)
+    cdef long long[:] start_view = start
+    cdef long long[:] order_view = order
+    cdef long long[:] where_view = where
+    with nogil:
+        # Count the nodes of each degree, then place each node in its bucket
+        for i in range(n):
+            start_view[degree[i] + 1] += 1
+        for d in range(top + 1):
+            start_view[d + 1] += start_view[d]
+        for i in range(n):
+            where_view[i] = start_view[degree[i]]
+            order_view[where_view[i]] = i
+            start_view[degree[i]] += 1
+        # Shift the bucket starts back, having been advanced by the placement
+        for d in range(top, 0, -1):
+            start_view[d] = start_view[d - 1]
+        start_view[0] = 0
+        for i in range(n):
+            v = order_view[i]
+            for j in range(offsets[v], offsets[v + 1]):
+                u = neighbors[j]
+                if degree[u] > degree[v]:
+                    # Swap u with the first node of its bucket, and move the
+                    # bucket's start past it
+                    d = degree[u]
+                    position = start_view[d]
+                    w = order_view[position]
+                    if u != w:
+                        order_view[where_view[u]] = w
+                        where_view[w] = where_view[u]
+                        order_view[position] = u
+                        where_view[u] = position
+                    start_view[d] += 1
+                    degree[u] -= 1
+    return core
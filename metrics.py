@@ -0,0 +1,19 @@
+# Labels for each different centrality/influence metric (kept apart from
+# seeds, so that they can be used without importing numpy)
+BETWEEN = "between"
+CLOSE = "close"
+DEGREE = "degree"
+DISCOUNT = "discount"
+GREEDY = "greedy"
+ITERATED = "iterated"
+
+# Order in which the metrics choose seeds
+ORDER = [BETWEEN, CLOSE, DEGREE, DISCOUNT, ITERATED, GREEDY]
+# Metrics from cheapest to most expensive, the order in which they are run
+# when there is a deadline
+COST_ORDER = [DEGREE, ITERATED, DISCOUNT, CLOSE, BETWEEN, GREEDY]
+
+# Progress of each metric in deadline mode
+FINISHED = "finished"
+TRUNCATED = "truncated"
+SKIPPED = "skipped"
@@ -1,10 +1,12 @@
 #include <cmath>
+#include <unordered_map>
 #include <vector>
 
 /*
  * Min-Max heap, as described here:
  * http://www.cs.otago.ac.nz/staffpriv/mike/Papers/MinMaxHeaps/MinMaxHeaps.pdf 
- * Also, limited size min & max heaps, implemented using a min-max heap
+ * Also, limited size min & max heaps, implemented using a min-max heap, and an
+ * indexed max heap, whose values can be updated by ID
  */
 
 namespace heap
@@ -246,4 +248,132 @@ public:
     }
 };
 
+
+template <typename T>
+class IndexedMaxHeap {
+private:
+    typedef decltype(T::ID) id_type;
+
+    std::vector<T> values;
+    // Maps value ID -> index of the value in the storage vector
+    std::unordered_map<id_type, int> positions;
+
+    void sift_up (int index) {
+        // While this node has a parent
+        while ( index > 0 ) {
+            int parent = (index - 1) / 2;
+            // Stop once this node is no larger than its parent
+            if ( this->values[index] <= this->values[parent] ) break;
+            // Swap this node and its parent, and continue from the parent
+            this->swap(index, parent);
+            index = parent;
+        }
+    }
+
+    void sift_down (int index) {
+        // While this node has children
+        while ( 2 * index + 1 < this->size() ) {
+            // Find the larger child
+            int child = 2 * index + 1;
+            if ( child + 1 < this->size() &&
+                 this->values[child + 1] > this->values[child] ) {
+                ++child;
+            }
+            // Stop once this node is no smaller than its children
+            if ( this->values[index] >= this->values[child] ) break;
+            // Swap this node and its larger child, and continue from the child
+            this->swap(index, child);
+            index = child;
+        }
+    }
+
+    inline void swap(int i, int j) {
+        T tmp = this->values[i];
+        this->values[i] = this->values[j];
+        this->values[j] = tmp;
+        // Keep the position index in sync
+        this->positions[this->values[i].ID] = i;
+        this->positions[this->values[j].ID] = j;
+    }
+
+    void remove_at (int index) {
+        // Forget the removed value's position
+        this->positions.erase(this->values[index].ID);
+        // Get the last value in the heap
+        T last = this->values.back();
+        // Remove the last value in the heap
+        this->values.pop_back();
+        // If the removed value was not the last element
+        if ( index < this->size() ) {
+            // Move the previously last value into its place
+            this->values[index] = last;
+            this->positions[last.ID] = index;
+            // Restore heap order, in whichever direction it is broken
+            this->sift_up(index);
+            this->sift_down(this->positions[last.ID]);
+        }
+    }
+
+public:
+    IndexedMaxHeap () { }
+    ~IndexedMaxHeap () { }
+
+    bool contains (id_type ID) {
+        // Check whether a value with this ID is in the heap
+        return this->positions.count(ID) > 0;
+    }
+
+    T get_max () {
+        // The maximum is always at the root
+        T ret = this->values[0];
+        this->remove_at(0);
+        // Return the maximum element
+        return ret;
+    }
+
+    void insert (T value) {
+        // If a value with the same ID is in the heap, replace it
+        if ( this->contains(value.ID) ) {
+            this->update(value);
+            return;
+        }
+        // Add a new element to the end of the storage vector
+        this->values.push_back(value);
+        this->positions[value.ID] = this->size() - 1;
+        // Restore heap order
+        this->sift_up(this->size() - 1);
+    }
+
+    T peek_max () {
+        // Return the value of the maximum element without removing it
+        return this->values[0];
+    }
+
+    void remove (id_type ID) {
+        // Remove the value with this ID, if any
+        if ( this->contains(ID) ) {
+            this->remove_at(this->positions[ID]);
+        }
+    }
+
+    int size () {
+        // Return the number of elements in the heap
+        return this->values.size();
+    }
+
+    void update (T value) {
+        // Insert the value, if its ID is not in the heap
+        if ( ! this->contains(value.ID) ) {
+            this->insert(value);
+            return;
+        }
+        // Replace the old value with the same ID
+        int index = this->positions[value.ID];
+        this->values[index] = value;
+        // Restore heap order, in whichever direction it is broken
+        this->sift_up(index);
+        this->sift_down(this->positions[value.ID]);
+    }
+};
+
 }
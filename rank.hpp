@@ -1,11 +1,11 @@
 class Ranking {
 public:
     float rank;
-    unsigned ID;
+    long long ID;
 
     Ranking() { }
 
-    Ranking (float rank, unsigned ID) {
+    Ranking (float rank, long long ID) {
         this->rank = rank;
         this->ID = ID;
     }
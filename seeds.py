@@ -1,39 +1,106 @@
 import inspect
 import itertools
-import networkx as nx
+import numpy as np
 import random
+import time
 
+from context import GraphContext
+from metrics import BETWEEN, CLOSE, DEGREE, DISCOUNT, GREEDY, ITERATED, \
+    FINISHED, TRUNCATED, SKIPPED
+import centrality
+import greedy
+import instrument
 import interface
+import metrics
 
-BETWEEN = "between"
-CLOSE = "close"
-DEGREE = "degree"
-DISCOUNT = "discount"
-ITERATED = "iterated"
+def largest(graph, ranks, mask, capacity, count=None):
+    # Limited-size max heap for storing the highest ranked nodes
+    heap = interface.rank_heap(capacity)
+    # Bulk insert the (rank, ID) pairs of every node in the mask, in node
+    # order, so ties resolve exactly as one insert per node would
+    heap.insert_many(
+        np.ascontiguousarray(np.asarray(ranks, dtype=np.float64)[mask]),
+        np.ascontiguousarray(np.asarray(graph.ids, dtype=np.int64)[mask]))
+    # Extract the (up to count) highest ranked IDs, in descending order
+    with instrument.span("extract"):
+        IDs, _ = heap.drain(count)
+    return IDs.tolist()
 
 class SeedSelector:
 
     # Labels for each different centrality/influence metric
-    order = [BETWEEN, CLOSE, DEGREE, DISCOUNT, ITERATED]
+    order = metrics.ORDER
+    # Metrics from cheapest to most expensive, the order in which they are
+    # run when there is a deadline
+    cost_order = metrics.COST_ORDER
 
     def __init__(self, graph, discount=0, degree=0, iterated=0, close=0,
-                 between=0, generations=3, entropy=0.0):
+                 between=0, generations=3, entropy=0.0, between_pivots=None,
+                 between_budget=None, context=None, greedy=0,
+                 opponents=None, greedy_games=10, greedy_candidates=None,
+                 deadline=None, prune=None):
         # Store graph data
         self.graph = graph
+        # Converted graph & memoized metric rankings, which may be shared by
+        # several selectors for the same graph
+        self.context = context if context is not None else \
+            GraphContext(graph)
         # Number of generations for the iterated degree metric
         self.generations = generations
+        # Maximum number of pivots & seconds used to estimate betweenness
+        # centrality (if both are None, it is computed exactly)
+        self.between_pivots = between_pivots
+        self.between_budget = between_budget
+        # Seeds which the greedy metric plays against (if None, as many of
+        # the highest degree nodes as seeds are chosen), the number of games
+        # simulated per evaluation, and the number of candidates taken from
+        # each cheap metric
+        self.opponents = opponents
+        if not greedy_games >= 1:
+            raise ValueError("greedy_games must be at least 1, not {}"
+                             .format(greedy_games))
+        self.greedy_games = greedy_games
+        self.greedy_candidates = greedy_candidates
+        # Time (a time.perf_counter() value) by which seeds must be chosen, or
+        # None to run every metric to completion
+        self.deadline = deadline
+        # If given, the expensive metrics only evaluate this many times as
+        # many nodes as they choose (those with the highest bounds), which is
+        # approximate; otherwise, they only skip the nodes which provably
+        # cannot be chosen
+        if prune is not None and not prune >= 1:
+            raise ValueError("prune must be at least 1, not {}".format(prune))
+        # (Exact betweenness centrality counts the shortest paths from every
+        # node, whichever nodes are ranked, so it cannot be pruned)
+        if prune is not None and between > 0 and between_pivots is None and \
+                between_budget is None and deadline is None:
+            raise ValueError("prune needs between_pivots, between_budget or a"
+                             " deadline to estimate betweenness centrality")
+        self.prune = prune
+        # Maps metric labels -> progress (FINISHED, TRUNCATED or SKIPPED), for
+        # the metrics run with a deadline
+        self.progress = {}
+        # Maps metric labels -> number of seeds chosen by degree instead,
+        # because the metric did not finish before the deadline
+        self.filled = {}
+        # Maps metric labels -> reports on how their ranking was computed
+        self.reports = {}
         # (1 + entropy) * # of seeds desired (seeds) are stored for each
         # metric, and the correct number are randomly chosen from that node set
         self.multiplier = 1.0 + entropy
         # Initialize seed sets
         self.seeds = {metric: set() for metric in self.order}
+        # Mask of the nodes (by index in the context's graph) which are
+        # already seeds of some metric, and cannot be chosen again
+        self.excluded = np.zeros(len(self.context.graph), dtype=bool)
         # Maps metric labels -> seed generating method (must take no arguments)
         self.seed_functions = {
             BETWEEN: self._between_seeds,
             CLOSE: self._close_seeds,
             DEGREE: lambda: self._iterated_degree_seeds(1),
             DISCOUNT: self._discount_seeds,
-            ITERATED: lambda: self._iterated_degree_seeds(self.generations)
+            ITERATED: lambda: self._iterated_degree_seeds(self.generations),
+            GREEDY: self._greedy_seeds
         }
         # Get information about this stack frame
         argspec = inspect.getargvalues(inspect.currentframe())
@@ -49,55 +116,68 @@ class SeedSelector:
         if getattr(self, BETWEEN) < 1:
             return
 
-        # Calculate betweenness centrality, filtering to non-zero ranks
-        betweenness = dict(
-            filter(lambda i: i[1] > 0, 
-                   nx.betweenness_centrality(nx.Graph(self.graph)).items()))
-        # Limited-size max heap for storing the highest ranked nodes
-        largest = interface.rank_heap(int(self.between * self.multiplier))
-        # For each node in the graph
-        for node, rank in betweenness.items():
-            # If this node is not already a seed node
-            if all(map(lambda s: node not in s, self.seeds.values())):
-                # Try adding its (rank, ID) tuple to the ranking max heap
-                largest.insert(rank, node)
+        graph = self.context.graph
+        # Mask of the nodes which are not already seed nodes, and have more
+        # than one neighbor (since others lie on no shortest paths)
+        eligible = ~self.excluded & (self.context.candidates()["degree"] > 1)
+        # Time budget for estimating betweenness centrality, which is limited
+        # by the deadline (if any)
+        budget = self.between_budget
+        if self.deadline is not None:
+            remaining = max(self.deadline - time.perf_counter(), 0)
+            budget = remaining if budget is None else min(budget, remaining)
+        # If betweenness centrality is computed exactly, or an exact ranking
+        # is already available
+        if self.between_pivots is None and budget is None or \
+                self.context.stored("betweenness") is not None:
+            # Calculate betweenness centrality
+            betweenness = self.context.betweenness()
+        else:
+            # Estimate betweenness centrality from sampled pivots, until the
+            # top ranked nodes (among the candidates, if pruning) are settled
+            # or the limits are reached
+            if self.prune is not None:
+                eligible = self._pruned(eligible,
+                                        int(self.between * self.multiplier))
+            betweenness, _, report = centrality.approximate_betweenness(
+                graph, int(self.between * self.multiplier), eligible,
+                self.between_pivots, budget)
+            self.reports[BETWEEN] = report
+            if report["truncated"] and self.deadline is not None:
+                self.progress[BETWEEN] = TRUNCATED
 
-        # While we do not have enough new seeds
-        for i in range(largest.size()):
-            # Extract the maximum-rank node from the heap
-            node, _ = largest.get_max()
-            # Add the node to the seed set
-            self.seeds[BETWEEN].add(node)
+        # Add the highest ranked eligible nodes with non-zero rank to the
+        # seed set
+        self._add_seeds(BETWEEN, largest(
+            graph, betweenness, eligible & (betweenness > 0),
+            int(self.between * self.multiplier)))
 
     def _close_seeds(self):
         # Terminate if this metric is not being used
         if getattr(self, CLOSE) < 1:
             return
 
-        # Convert graph data into networkx Graph class
-        G = nx.Graph(self.graph)
-        # Limited-size max heap for storing the highest ranked nodes
-        largest = interface.rank_heap(int(self.close * self.multiplier))
-
-        # For each node in the graph
-        for node in self.graph:
-            # If this node is not already a seed node
-            if all(map(lambda s: node not in s, self.seeds.values())):
-                try:
-                    # Calculate its closeness centrality
-                    rank = nx.closeness_centrality(G, node)
-                    # Try adding its (rank, ID) tuple to the ranking max heap
-                    largest.insert(rank, node)
-                except Exception:
-                    # Ignore nodes for which the computation fails
-                    continue
+        graph = self.context.graph
+        # Mask of the nodes which are not already seed nodes
+        eligible = ~self.excluded
+        # Calculate the closeness centrality of every node, except for those
+        # which cannot be among the highest ranked eligible nodes (which are
+        # in the top count overall, counting the ineligible nodes), or which
+        # are not among the candidates (if pruning)
+        stats = {}
+        closeness, computed = self.context.closeness(
+            int(self.close * self.multiplier) + int(self.excluded.sum()),
+            self.deadline, stats, eligible,
+            None if self.prune is None else
+            int(self.prune * self.close * self.multiplier))
+        computed = computed & eligible
+        if stats.get("truncated", False):
+            self.progress[CLOSE] = TRUNCATED
 
-        # While we do not have enough new seeds
-        for i in range(largest.size()):
-            # Extract the maximum-rank node from the heap
-            node, _ = largest.get_max()
-            # Add the node to the seed set
-            self.seeds[CLOSE].add(node)
+        # Add the highest ranked nodes whose closeness centrality was
+        # computed to the seed set
+        self._add_seeds(CLOSE, largest(
+            graph, closeness, computed, int(self.close * self.multiplier)))
 
     def _discount_seeds(self):
         # Terminate if this metric is not being used
@@ -106,72 +186,44 @@ class SeedSelector:
 
         # Probability that a node will color its neighbor
         p = .01
-        # extra * self.multiplier * self.discount of the largest nodes are
-        # stored to be updated by the degree discount algorithm
-        extra = 2
-        # Maps node ID -> discounted node degree
-        discounted = {}
+        # Indexed max heap of (discounted node degree, ID), which holds every
+        # node that can still be chosen
+        discounted = interface.indexed_heap()
         # Maps node ID -> number of neighboring seeds
         neighbors = {}
-        # Limited-size max heap for storing the highest ranked nodes
-        largest = interface.rank_heap(
-            int(self.discount * self.multiplier * extra))
 
-        # For each node in the graph
-        for node, adjacent in self.graph.items():
+        # For each node in the graph (in the same order as the context's
+        # graph)
+        excluded = self.excluded.tolist()
+        for i, (node, adjacent) in enumerate(self.graph.items()):
             # If this node is not already a seed
-            if all(map(lambda s: node not in s, self.seeds.values())):
-                # Try adding its (rank, ID) tuple to the ranking max heap
-                largest.insert(len(adjacent), node)
-        # While the rank heap contains nodes
-        while largest.size() > 0:
-            # Extract the (rank, node) tuple of maximum rank
-            node, rank = largest.get_max()
-            # Initialize an entry in the discounted & neighbors mappings
-            discounted[node] = rank
-            neighbors[node] = \
-                len(self.seeds[DISCOUNT].intersection(self.graph[node]))
+            if not excluded[i]:
+                # Add its (rank, ID) tuple to the discounted degree heap
+                discounted.insert(len(adjacent), node)
+                neighbors[node] = 0
 
         # While we do not have enough new seeds
         for i in range(int(self.discount * self.multiplier)):
-            # Get the node with maximum discounted degree
-            best_seed = max(discounted, key=discounted.get)
+            # Stop if every node has been chosen
+            if discounted.size() == 0:
+                break
+            # Extract the node with maximum discounted degree, which also
+            # ignores it in future iterations
+            best_seed, _ = discounted.get_max()
             # Add the node to the seed set
-            self.seeds[DISCOUNT].add(best_seed)
-            # Ignore this node in future iterations
-            del discounted[best_seed]
-            del neighbors[best_seed]
+            self._add_seeds(DISCOUNT, [best_seed])
             # Discount the degrees of its neighbors
             for node in self.graph[best_seed]:
-                try:
-                    neighbors[node] += 1
-                except KeyError:
+                # Skip neighbors which cannot be chosen
+                if node not in discounted:
                     continue
+                neighbors[node] += 1
                 dv = len(self.graph[node])
                 tv = neighbors[node]
-                discounted[node] = dv - 2 * tv - (dv - tv) * tv * p
+                # Update the neighbor's rank in the heap
+                discounted.insert(dv - 2 * tv - (dv - tv) * tv * p, node)
 
     def _iterated_degree_seeds(self, generations):
-
-        def bfs_count(node, generations):
-            # Initialize a depth-limited frontier record
-            frontier = [[] for i in range(generations + 1)]
-            # Set current generation to 0
-            current = 0
-            # Add the root node to the current generation
-            frontier[current].append(node)
-
-            # While we have not traversed to the required depth
-            while current < generations:
-                # Move to the next generation
-                current += 1
-                # For each node in the last generation
-                for n in frontier[current - 1]:
-                    # Add its children to the current generation
-                    frontier[current] += self.graph[n]
-            # Return the total number of descendants (iterated out-degree)
-            return sum(len(gen) for gen in frontier[1:])
-
         # Terminate if this metric is not being used
         new = self.degree
         label = DEGREE
@@ -185,23 +237,58 @@ class SeedSelector:
                 new = self.iterated
                 label = ITERATED
 
-        # Maps node ID -> iterated out-degree
-        iterated = {}
-        # Limited-size max heap for storing the highest ranked nodes
-        largest = interface.rank_heap(int(new * self.multiplier))
-        # For each node in the graph
-        for node in self.graph:
-            # If this node is not already a seed
-            if all(map(lambda s: node not in s, self.seeds.values())):
-                # Try adding its (rank, ID) tuple to the ranking max heap
-                largest.insert(bfs_count(node, generations), node)
+        graph = self.context.graph
+        # Count the walks of up to the given length from every node (its
+        # iterated out-degree)
+        iterated = self.context.iterated_degree(generations)
+        # Add the (up to new) highest ranked eligible nodes to the seed set
+        self._add_seeds(label, largest(
+            graph, iterated, ~self.excluded, int(new * self.multiplier),
+            new))
 
-        # While we do not have enough new seeds
-        for i in range(new):
-            # Extract the maximum-rank node from the heap
-            node, _ = largest.get_max()
-            # Add the node to the seed set
-            self.seeds[label].add(node)
+    def _greedy_seeds(self):
+        # Terminate if this metric is not being used
+        if getattr(self, GREEDY) < 1:
+            return
+
+        graph = self.context.graph
+        new = int(self.greedy * self.multiplier)
+        # Mask of the nodes which are not already seed nodes
+        eligible = ~self.excluded
+        # Only the highest ranked eligible nodes by degree & iterated degree
+        # are candidates, since simulating every node would be far too slow
+        size = self.greedy_candidates if self.greedy_candidates is not None \
+            else max(10 * new, 50)
+        candidates = set()
+        for generations in sorted({1, self.generations}):
+            candidates.update(largest(
+                graph, self.context.iterated_degree(generations), eligible,
+                size))
+        # By default, play against as many of the highest degree nodes as our
+        # whole team plays (including the other metrics' seeds, which the
+        # opponent's seeds may cancel out)
+        opponents = self.opponents
+        if opponents is None:
+            opponents = largest(
+                graph, self.context.iterated_degree(1),
+                np.ones(len(graph), dtype=bool),
+                sum(getattr(self, metric) for metric in self.order))
+        # The seeds chosen by the other metrics are already on our team
+        base = np.flatnonzero(self.excluded).tolist()
+        # Evaluate the highest degree candidates first, in case the deadline
+        # cuts the evaluations short
+        candidates = sorted((graph.index[node] for node in candidates),
+                            key=lambda i: (-graph.degree[i], i))
+        chosen, report = greedy.celf(
+            graph, new, candidates, [graph.index[node] for node in opponents],
+            base, self.greedy_games,
+            random.getrandbits(64), self.deadline)
+        self.reports[GREEDY] = report
+        if report["truncated"] and self.deadline is not None:
+            self.progress[GREEDY] = TRUNCATED
+        # Add the chosen nodes to the seed set
+        ids = graph.id_list()
+        self._add_seeds(GREEDY, [ids[node] for node in chosen])
 
     def choose(self):
         # If this selector is using semi-random nodes
@@ -232,7 +319,56 @@ class SeedSelector:
         return chosen
 
     def generate(self):
-        # For each centrality/influence metric
-        for metric in self.order:
-            # Generate & store the desired number of seeds
-            self.seed_functions[metric]()
+        # Without a deadline, run every metric to completion
+        if self.deadline is None:
+            # For each centrality/influence metric
+            for metric in self.order:
+                # Generate & store the desired number of seeds
+                with instrument.span(metric):
+                    self.seed_functions[metric]()
+            return
+
+        # Otherwise, run the cheapest metrics first, so that the expensive
+        # metrics (which stop early) use whatever time remains
+        for metric in self.cost_order:
+            if getattr(self, metric) < 1:
+                continue
+            if time.perf_counter() >= self.deadline:
+                self.progress[metric] = SKIPPED
+            else:
+                self.progress[metric] = FINISHED
+                with instrument.span(metric):
+                    self.seed_functions[metric]()
+            # Fill in any seeds which the metric could not choose in time with
+            # the highest degree eligible nodes, so that a full seed set is
+            # always chosen
+            if self.progress[metric] != FINISHED:
+                self._fill_seeds(metric)
+
+    def _fill_seeds(self, metric):
+        graph = self.context.graph
+        missing = int(getattr(self, metric) * self.multiplier) - \
+            len(self.seeds[metric])
+        if missing < 1:
+            return
+        self.filled[metric] = missing
+        self._add_seeds(metric, largest(
+            graph, self.context.iterated_degree(1), ~self.excluded, missing))
+
+    def _add_seeds(self, metric, nodes):
+        # Add the given node IDs to the metric's seed set, and exclude them
+        # from every other metric
+        nodes = list(nodes)
+        self.seeds[metric].update(nodes)
+        index = self.context.graph.index
+        self.excluded[[index[node] for node in nodes]] = True
+
+    def _pruned(self, eligible, count):
+        # Mask of the prune * count eligible nodes with the highest k-core
+        # numbers (breaking ties by their 2-hop reach bounds), which are the
+        # only candidates of the expensive metrics in approximate mode
+        order = np.lexsort((-self.context.candidates()["reach"],
+                            -self.context.cores()))
+        pruned = np.zeros(len(eligible), dtype=bool)
+        pruned[order[eligible[order]][:int(self.prune * count)]] = True
+        return pruned
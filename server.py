@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+
+import instrument
+import metrics
+
+# Environment variable giving the socket of a running server, which
+# choose.py then sends its requests to
+ENVIRONMENT = "PANDEMANIAC_SERVER"
+# Default location of the server's socket
+SOCKET = os.path.join(tempfile.gettempdir(),
+                      "pandemaniac-{}.sock".format(os.getuid()))
+# SeedSelector arguments which a request may give (besides the deadline,
+# which is given in seconds from when the request is received)
+OPTIONS = set(metrics.ORDER) | {
+    "entropy", "generations", "between_pivots", "between_budget",
+    "opponents", "greedy_games", "greedy_candidates", "prune"}
+# Number of SeedSelectors kept for repeated requests; the least recently used
+# is evicted first (graphs & their rankings are kept regardless)
+SELECTORS = 16
+
+def _plain(value):
+    # Convert NumPy scalars (such as node IDs in reports) for JSON
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError("{!r} is not JSON serializable".format(value))
+
+def request(path, message):
+    # Send one request to the server listening on the given socket, and
+    # return its response
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall(json.dumps(message).encode() + b"\n")
+        s.shutdown(socket.SHUT_WR)
+        response = b"".join(iter(lambda: s.recv(1 << 16), b""))
+    response = json.loads(response.decode())
+    if "error" in response:
+        raise RuntimeError(response["error"])
+    return response
+
+class SeedServer(socketserver.UnixStreamServer):
+
+    def __init__(self, path, cache=True, cache_dir=None,
+                 selectors=SELECTORS):
+        # Requests are answered one at a time, so that they can share graphs
+        # & rankings without locking
+        super().__init__(path, RequestHandler)
+        # Whether compiled graphs & rankings are read from (and written to)
+        # disk, and the directory they are stored in
+        self.cache = cache
+        self.cache_dir = cache_dir
+        # Maps graph paths -> (size & modification time of the graph file,
+        # GraphContext of the graph)
+        self.graphs = {}
+        # Maps (graph path, SeedSelector arguments) -> SeedSelector, so that
+        # repeated requests only choose from the stored seeds, in order of
+        # use (up to the given number are kept)
+        self.selectors = OrderedDict()
+        self.max_selectors = selectors
+
+    def load(self, path):
+        # Return the context of the graph file at the given path, loading it
+        # if it is not resident (or has changed since it was loaded)
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        if path in self.graphs and self.graphs[path][0] == key:
+            return self.graphs[path][1]
+        import context
+        import graph
+        with instrument.span("parse_data"):
+            if self.cache:
+                data = graph.load_cached(path, self.cache_dir)
+            else:
+                data = graph.load_json(path)
+        shared = context.GraphContext(
+            data, context.cache_location(path, self.cache_dir)
+            if self.cache else None)
+        self.graphs[path] = (key, shared)
+        # Seeds chosen for the old graph are no longer valid
+        for selector in list(self.selectors):
+            if selector[0] == path:
+                del self.selectors[selector]
+        return shared
+
+    def select(self, message):
+        # Answer a request for seeds, which gives the graph file, the
+        # SeedSelector arguments, the number of trials and (optionally) a
+        # deadline in seconds
+        start = time.perf_counter()
+        path = os.path.abspath(message["graph"])
+        kwargs = message.get("kwargs", {})
+        unknown = set(kwargs) - OPTIONS
+        if unknown:
+            raise ValueError("unknown arguments: {}".format(
+                ", ".join(sorted(unknown))))
+        shared = self.load(path)
+        for node in kwargs.get("opponents") or []:
+            if node not in shared.graph:
+                raise ValueError(
+                    "opponent seed {} is not in the graph".format(node))
+
+        # Seeds chosen within a deadline are not reused, since they depend on
+        # how much time was left
+        key = (path, json.dumps(kwargs, sort_keys=True))
+        deadline = message.get("deadline")
+        selector = self.selectors.get(key) if deadline is None else None
+        if selector is not None:
+            self.selectors.move_to_end(key)
+        else:
+            import seeds
+            if deadline is not None:
+                kwargs = dict(kwargs, deadline=start + deadline)
+            with instrument.span("generate"):
+                selector = seeds.SeedSelector(shared.graph, context=shared,
+                                              **kwargs)
+            if deadline is None and self.max_selectors > 0:
+                self.selectors[key] = selector
+                while len(self.selectors) > self.max_selectors:
+                    self.selectors.popitem(last=False)
+        return {"seeds": [selector.choose()
+                          for i in range(message.get("trials", 1))],
+                "reports": selector.reports, "progress": selector.progress,
+                "filled": selector.filled}
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        # Each connection carries one request & one response, as lines of
+        # JSON (connections which send nothing, such as the check for a
+        # running server, get no response)
+        line = self.rfile.readline()
+        if not line:
+            return
+        # Only the time spent on this request is reported
+        instrument.reset()
+        try:
+            response = self.server.select(json.loads(line))
+        except Exception as e:
+            response = {"error": "{}: {}".format(type(e).__name__, e)}
+        self.wfile.write(json.dumps(response, default=_plain).encode() +
+                         b"\n")
+        if instrument.enabled:
+            instrument.report()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve seed selection requests over a Unix socket, keeping"
+                    " graphs & their rankings in memory between requests")
+    parser.add_argument("--socket", metavar="PATH", default=SOCKET,
+                        help="The socket to listen on (by default, {})"
+                             .format(SOCKET))
+    parser.add_argument("--cache-dir", metavar="DIR", default=None,
+                        help="The directory in which compiled graphs & "
+                             "metric rankings are stored (by default, next "
+                             "to each graph file)")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="Parse graph files without using or writing "
+                             "compiled graphs or stored metric rankings")
+    parser.add_argument("--selectors", metavar="COUNT", type=int,
+                        default=SELECTORS,
+                        help="The number of seed selections kept for repeated"
+                             " requests with the same arguments (by default, "
+                             "{})".format(SELECTORS))
+    parser.add_argument("--instrument", action="store_true",
+                        help="Report the time spent in each phase to stderr, "
+                             "after every request")
+    parsed = parser.parse_args()
+    if parsed.instrument:
+        instrument.enable()
+
+    # Remove the socket of a server which is no longer running
+    if os.path.exists(parsed.socket):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(parsed.socket)
+            sys.exit("server.py: a server is already listening on {}"
+                     .format(parsed.socket))
+        except ConnectionRefusedError:
+            os.remove(parsed.socket)
+    # Remove the socket when terminated, as when interrupted
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    with SeedServer(parsed.socket, parsed.cache, parsed.cache_dir,
+                    parsed.selectors) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(parsed.socket)
+
+if __name__ == "__main__":
+    main()
@@ -50,6 +50,40 @@ Example:
      50: ({"strategy1": 280, "strategy5": 150, "strategy2": 5},
           {"strategy1": ["9", "5"], "strategy2": ["6", "7"], ... })}
 
+Games can be spread over a process pool, which reads the graph from shared
+memory. Each game then draws its random cut-offs from its own stream, derived
+from the given seed, so results are reproducible and identical to a serial run
+with the same seed:
+>>> sim.run(graph, nodes, games, processes=4, seed=144)
+
+Many games can also be played together, as one nodes x games color array,
+which amortizes each pass over the graph across the batch; games drop out of
+the batch as they stop. Like parallel games, batched games use the seed:
+>>> sim.run(graph, nodes, games, batch=50, seed=144)
+
+Games that settle into a cycle (such as a period-2 oscillation) can be ended
+as soon as the cycle is found, with identical results. Per-game statistics,
+including the number of generations that were skipped, are appended to the
+given list:
+>>> stats = []
+>>> sim.run(graph, nodes, games, cycles=stats)
+
+Both engines also have an incremental mode, which only re-evaluates nodes next
+to the previous generation's changes, with identical results:
+>>> sim.run(graph, nodes, games, incremental=True)
+
+The array-backed engine can be selected for large graphs; it returns the same
+results as the default engine:
+>>> sim.run(graph, nodes, games, engine=sim.CSR)
+
+A callback can follow each generation of a serial game, receiving the
+generation number, the number of nodes that changed color and the seconds the
+generation took. When instrumentation is enabled (by setting the
+PANDEMANIAC_INSTRUMENT environment variable), every generation is reported to
+stderr by default:
+>>> sim.run(graph, nodes, games,
+            callback=lambda generation, changed, seconds: print(changed))
+
 Possible Errors:
 - KeyError: Will occur if any seed nodes are invalid (i.e. do not exist on the
             graph).
@@ -57,28 +91,176 @@ Possible Errors:
 
 from collections import Counter, OrderedDict
 from copy import deepcopy
-from random import randint
+from functools import partial
+from multiprocessing import Pool
 from random import choice
+import random
+import time
+
+import numpy as np
+
+from graph import CSRGraph, as_csr
+import instrument
+
+# Simulation engines accepted by run
+DICT = "dict"
+CSR = "csr"
 
 
-def run(adj_list, node_mappings, games=50):
+def run(adj_list, node_mappings, games=50, engine=DICT, incremental=False,
+        processes=None, seed=None, cycles=None, batch=None, callback=None):
   """
   Function: run
   -------------
   Runs the simulation on a graph with the given node mappings.
 
-  adj_list: A dictionary representation of the graph adjacencies.
+  adj_list: A dictionary representation of the graph adjacencies, or a
+            CSRGraph (such as a compiled graph).
   node_mappings: A dictionary where the key is a name and the value is a array
                  list of seed nodes associated with that name.
+  engine: DICT to simulate on the adjacency dictionary, or CSR to relabel the
+          graph once into arrays and use the vectorized engine.
+  incremental: Whether to only re-evaluate the nodes whose neighborhood
+               changed in the previous generation.
+  processes: If given, the number of worker processes to play games in
+             parallel. Workers always use the CSR engine.
+  seed: If given, each game uses its own random stream derived from this seed
+        (and the game number), instead of the global random state.
+  cycles: If given, a list which receives the cycle detection statistics of
+          each game (see find_cycle), in game order.
+  batch: If given, the number of games to play together with run_batch.
+         Batched games always use the CSR engine.
+  callback: If given, called after each generation of each game (see
+            run_simulation). By default, generations are reported when
+            instrumentation is enabled. Not available for parallel or
+            batched games.
   """
+  if processes is not None or batch is not None:
+    if callback is not None:
+      raise ValueError("Generation callbacks are not available for parallel "
+                       "or batched games")
+  elif callback is None:
+    callback = instrument.generation_callback("simulation")
+  if (processes is not None or batch is not None) and seed is None:
+    seed = random.getrandbits(64)
+  if processes is not None:
+    return run_parallel(adj_list, node_mappings, games, incremental, processes,
+                        seed, cycles)
+  if batch is not None:
+    graph = as_csr(adj_list)
+    results = []
+    for first in range(0, games, batch):
+      played = range(first, min(first + batch, games))
+      all_mappings = [choose_node_mappings(node_mappings, i) for i in played]
+      rngs = [game_rng(seed, i) for i in played]
+      res = run_batch(graph, all_mappings, rngs, cycles=cycles)
+      results.extend(zip(res, all_mappings))
+    return results
+
+  if engine == CSR:
+    # Relabel the graph once, and share it between all games
+    graph = as_csr(adj_list)
+    simulate = run_frontier_csr if incremental else run_simulation_csr
+  elif engine == DICT:
+    graph = adj_list
+    if incremental:
+      # Find the nodes affected by each node once, for all games
+      simulate = partial(run_frontier, reverse=reverse_adjacency(adj_list))
+    else:
+      simulate = run_simulation
+  else:
+    raise ValueError("Unknown simulation engine: {}".format(engine))
+
   results = []
   for i in range(games):
       mappings = choose_node_mappings(node_mappings, i)
-      res = run_simulation(adj_list, mappings)
+      rng = random if seed is None else game_rng(seed, i)
+      game_cycles = None if cycles is None else {}
+      res = simulate(graph, mappings, rng, cycles=game_cycles,
+                     callback=callback)
       results.append((res, mappings))
+      if cycles is not None:
+        cycles.append(game_cycles)
   return results
 
 
+def run_parallel(adj_list, node_mappings, games, incremental, processes, seed,
+                 cycles=None):
+  """
+  Function: run_parallel
+  ----------------------
+  Runs the games of run in a process pool, returning the results in game
+  order. The graph is relabeled once and placed in shared memory, which each
+  worker attaches to; only the (relabeled) seed nodes are sent per game.
+  """
+  graph = as_csr(adj_list)
+  blocks, spec = graph.share(reverse=incremental)
+  try:
+    tasks = []
+    all_mappings = []
+    for i in range(games):
+      mappings = choose_node_mappings(node_mappings, i)
+      all_mappings.append(mappings)
+      # Relabel the seeds here, since workers do not have the node IDs
+      indexed = dict([(name, [graph.index[node] for node in nodes])
+                      for (name, nodes) in mappings.items()])
+      tasks.append((indexed, seed, i, cycles is not None))
+    with Pool(processes, initializer=attach_worker,
+              initargs=(spec, incremental)) as pool:
+      played = pool.map(play_worker, tasks)
+  finally:
+    for block in blocks:
+      block.close()
+      block.unlink()
+  if cycles is not None:
+    cycles.extend(game_cycles for (_, game_cycles) in played)
+  return [(res, mappings)
+          for ((res, _), mappings) in zip(played, all_mappings)]
+
+
+# Graph and simulation function of a worker process, set by attach_worker
+worker_state = {}
+
+
+def attach_worker(spec, incremental):
+  """
+  Function: attach_worker
+  -----------------------
+  Initializes a worker process of run_parallel, attaching to the shared graph.
+  """
+  graph, blocks = CSRGraph.attach(spec)
+  worker_state["graph"] = graph
+  # The shared memory blocks must stay open while the graph is in use
+  worker_state["blocks"] = blocks
+  worker_state["simulate"] = \
+    run_frontier_csr if incremental else run_simulation_csr
+
+
+def play_worker(task):
+  """
+  Function: play_worker
+  ---------------------
+  Plays one game of run_parallel in a worker process, returning its result
+  and cycle detection statistics.
+  """
+  (mappings, seed, i, detect_cycles) = task
+  game_cycles = {} if detect_cycles else None
+  res = worker_state["simulate"](worker_state["graph"], mappings,
+                                 game_rng(seed, i), indexed=True,
+                                 cycles=game_cycles)
+  return (res, game_cycles)
+
+
+def game_rng(seed, i):
+  """
+  Function: game_rng
+  ------------------
+  Returns the random number generator of the ith game of a seeded run.
+  """
+  state = np.random.SeedSequence(seed, spawn_key=(i,)).generate_state(2)
+  return random.Random(int(state[0]) << 32 | int(state[1]))
+
+
 def choose_node_mappings(node_mappings, i):
   """
   Function: choose_node_mappings
@@ -101,7 +283,8 @@ def choose_node_mappings(node_mappings, i):
   return result
 
 
-def run_simulation(adj_list, node_mappings):
+def run_simulation(adj_list, node_mappings, rng=random, cycles=None,
+                   callback=None):
   """
   Function: run_simulation
   ------------------------
@@ -111,6 +294,12 @@ def run_simulation(adj_list, node_mappings):
   adj_list: A dictionary representation of the graph adjacencies.
   node_mappings: A dictionary where the key is a name and the value is a list
                  of seed nodes associated with that name.
+  rng: The random number generator used for the stopping point.
+  cycles: If given, cycle detection is enabled, and this dictionary receives
+          its statistics (see find_cycle).
+  callback: If given, called after each generation with the generation
+            number, the number of nodes which changed color, and the seconds
+            it took to update them.
   """
   # Stores a mapping of nodes to their color.
   node_color = dict([(node, None) for node in adj_list.keys()])
@@ -122,21 +311,358 @@ def run_simulation(adj_list, node_mappings):
   # converge.
   prev = None
   nodes = adj_list.keys()
-  while not is_stable(generation, randint(100, 200), prev, node_color):
+  history = None if cycles is None else ({}, [])
+  if history is not None:
+    find_cycle(history, generation, hash(tuple(node_color.values())),
+               get_result(node_mappings.keys(), node_color), rng, cycles)
+  while not is_stable(generation, rng.randint(100, 200), prev, node_color):
+    if callback is not None:
+      start = time.perf_counter()
     prev = deepcopy(node_color)
     for node in nodes:
       (changed, color) = update(adj_list, prev, node)
       # Store the node's new color only if it changed.
       if changed: node_color[node] = color
+    if callback is not None:
+      callback(generation + 1,
+               sum(1 for node in nodes if prev[node] != node_color[node]),
+               time.perf_counter() - start)
     # NOTE: prev contains the state of the graph of the previous generation,
     # node_colros contains the state of the graph at the current generation.
     # You could check these two dicts if you want to see the intermediate steps
     # of the epidemic.
     generation += 1
+    if history is not None:
+      result = find_cycle(history, generation,
+                          hash(tuple(node_color.values())),
+                          get_result(node_mappings.keys(), node_color), rng,
+                          cycles)
+      if result is not None:
+        return result
+
+  if cycles is not None:
+    cycles.update(generations=generation, skipped=0, period=None)
+  return get_result(node_mappings.keys(), node_color)
 
+
+def run_frontier(adj_list, node_mappings, rng=random, cycles=None,
+                 reverse=None, callback=None):
+  """
+  Function: run_frontier
+  ----------------------
+  Runs the simulation incrementally, returning the same result as
+  run_simulation. After the first generation, only the nodes that changed
+  color and the nodes having them as neighbors are updated, so the work per
+  generation scales with the size of the changing frontier.
+
+  adj_list: A dictionary representation of the graph adjacencies.
+  node_mappings: A dictionary where the key is a name and the value is a list
+                 of seed nodes associated with that name.
+  rng: The random number generator used for the stopping point.
+  cycles: If given, cycle detection is enabled, and this dictionary receives
+          its statistics (see find_cycle).
+  reverse: The result of reverse_adjacency(adj_list), if already computed.
+  callback: If given, called after each generation (see run_simulation).
+  """
+  if reverse is None:
+    reverse = reverse_adjacency(adj_list)
+  node_color = dict([(node, None) for node in adj_list.keys()])
+  init(node_mappings, node_color)
+  generation = 1
+
+  # Same stopping rule (and random number draws) as run_simulation.
+  changed = None
+  frontier = adj_list.keys()
+  history = None if cycles is None else ({}, [])
+  if history is not None:
+    # The fingerprint and color counts are updated as nodes change, so that
+    # cycle detection also scales with the frontier
+    fingerprint = 0
+    for (node, color) in node_color.items():
+      fingerprint ^= hash((node, color))
+    color_nodes = get_result(node_mappings.keys(), node_color)
+    find_cycle(history, generation, fingerprint, dict(color_nodes), rng,
+               cycles)
+  while not is_stable_frontier(generation, rng.randint(100, 200), changed):
+    if callback is not None:
+      start = time.perf_counter()
+    # Evaluate the whole frontier before applying any change, so that every
+    # update sees the previous generation
+    changed = {}
+    for node in frontier:
+      (_, color) = update(adj_list, node_color, node)
+      if color != node_color[node]:
+        changed[node] = color
+    if history is not None:
+      for (node, color) in changed.items():
+        fingerprint ^= hash((node, node_color[node])) ^ hash((node, color))
+        if node_color[node] is not None:
+          color_nodes[node_color[node]] -= 1
+        color_nodes[color] += 1
+    node_color.update(changed)
+    # Only changed nodes and the nodes adjacent to them can change next
+    frontier = set(changed)
+    for node in changed:
+      frontier.update(reverse[node])
+    if callback is not None:
+      callback(generation + 1, len(changed), time.perf_counter() - start)
+    generation += 1
+    if history is not None:
+      result = find_cycle(history, generation, fingerprint, dict(color_nodes),
+                          rng, cycles)
+      if result is not None:
+        return result
+
+  if cycles is not None:
+    cycles.update(generations=generation, skipped=0, period=None)
   return get_result(node_mappings.keys(), node_color)
 
 
+def run_simulation_csr(graph, node_mappings, rng=random, cycles=None,
+                       indexed=False, callback=None):
+  """
+  Function: run_simulation_csr
+  ----------------------------
+  Runs the simulation on a CSRGraph, storing node colors as an integer array
+  (0 for no color, i + 1 for the ith name in node_mappings). Returns the same
+  dictionary as run_simulation.
+
+  graph: A CSRGraph representation of the graph adjacencies.
+  node_mappings: A dictionary where the key is a name and the value is a list
+                 of seed nodes associated with that name.
+  rng: The random number generator used for the stopping point.
+  cycles: If given, cycle detection is enabled, and this dictionary receives
+          its statistics (see find_cycle).
+  indexed: Whether the seed nodes are given as node indices of graph.
+  callback: If given, called after each generation (see run_simulation).
+  """
+  teams = len(node_mappings) + 1
+  curr = init_csr(graph, node_mappings, indexed)
+  # Preallocated buffer for the next generation, swapped with curr
+  spare = np.empty_like(curr)
+  # Bin of each (node, neighbor color) pair, minus the neighbor color
+  bins = graph.rows * teams
+  generation = 1
+
+  # Same stopping rule (and random number draws) as run_simulation.
+  prev = None
+  history = None if cycles is None else ({}, [])
+  if history is not None:
+    find_cycle(history, generation, fingerprint_csr(curr, teams),
+               get_result_csr(node_mappings.keys(), curr), rng, cycles)
+  while not is_stable_csr(generation, rng.randint(100, 200), prev, curr):
+    if callback is not None:
+      start = time.perf_counter()
+    update_csr(graph, bins, teams, curr, spare)
+    # prev now holds the previous generation, and the old prev buffer is
+    # overwritten by the next update
+    prev, curr, spare = curr, spare, curr
+    if callback is not None:
+      callback(generation + 1, int(np.count_nonzero(prev != curr)),
+               time.perf_counter() - start)
+    generation += 1
+    if history is not None:
+      result = find_cycle(history, generation, fingerprint_csr(curr, teams),
+                          get_result_csr(node_mappings.keys(), curr), rng,
+                          cycles)
+      if result is not None:
+        return result
+
+  if cycles is not None:
+    cycles.update(generations=generation, skipped=0, period=None)
+  return get_result_csr(node_mappings.keys(), curr)
+
+
+def run_frontier_csr(graph, node_mappings, rng=random, cycles=None,
+                     indexed=False, callback=None):
+  """
+  Function: run_frontier_csr
+  --------------------------
+  Runs the simulation incrementally on a CSRGraph, returning the same result
+  as run_simulation_csr.
+
+  graph: A CSRGraph representation of the graph adjacencies.
+  node_mappings: A dictionary where the key is a name and the value is a list
+                 of seed nodes associated with that name.
+  rng: The random number generator used for the stopping point.
+  cycles: If given, cycle detection is enabled, and this dictionary receives
+          its statistics (see find_cycle).
+  indexed: Whether the seed nodes are given as node indices of graph.
+  callback: If given, called after each generation (see run_simulation).
+  """
+  teams = len(node_mappings) + 1
+  node_color = init_csr(graph, node_mappings, indexed)
+  generation = 1
+
+  # Same stopping rule (and random number draws) as run_simulation.
+  changed = None
+  frontier = np.arange(len(graph))
+  history = None if cycles is None else ({}, [])
+  if history is not None:
+    # The fingerprint and color counts are updated as nodes change, so that
+    # cycle detection also scales with the frontier
+    fingerprint = fingerprint_csr(node_color, teams)
+    counts = np.bincount(node_color, minlength=teams)
+    find_cycle(history, generation, fingerprint,
+               count_result(node_mappings.keys(), counts), rng, cycles)
+  while not is_stable_frontier(generation, rng.randint(100, 200), changed):
+    if callback is not None:
+      start = time.perf_counter()
+    (changed, previous) = update_frontier_csr(graph, teams, node_color,
+                                              frontier)
+    # Only changed nodes and the nodes adjacent to them can change next
+    _, affected = graph.reverse.select(changed)
+    frontier = np.union1d(changed, affected)
+    if callback is not None:
+      callback(generation + 1, len(changed), time.perf_counter() - start)
+    generation += 1
+    if history is not None:
+      fingerprint ^= fingerprint_csr(previous, teams, changed) ^ \
+        fingerprint_csr(node_color[changed], teams, changed)
+      counts += np.bincount(node_color[changed], minlength=teams) - \
+        np.bincount(previous, minlength=teams)
+      result = find_cycle(history, generation, fingerprint,
+                          count_result(node_mappings.keys(), counts), rng,
+                          cycles)
+      if result is not None:
+        return result
+
+  if cycles is not None:
+    cycles.update(generations=generation, skipped=0, period=None)
+  return get_result_csr(node_mappings.keys(), node_color)
+
+
+def find_cycle(history, generation, fingerprint, result, rng, cycles):
+  """
+  Function: find_cycle
+  --------------------
+  Records the state fingerprint and result of a generation in history (a
+  tuple of a dictionary and a list, initially empty, which must receive every
+  generation from the first). If the state repeats one from before the
+  previous generation, the epidemic cycles from there on, so the outcome only
+  depends on the stopping point: the remaining stopping points are drawn as
+  is_stable would, and the result at the stopping point is returned without
+  simulating the skipped generations. Otherwise, returns None.
+
+  Fixed points are left to the is_stable check. A cycling epidemic which
+  reaches generation 200 without hitting a stopping point would never end, so
+  such a game is scored at the generation where that is known.
+
+  cycles: A dictionary, which receives the generation the game ended at
+          ("generations"), the number of generations which were not simulated
+          ("skipped"), and the period of the detected cycle ("period").
+  """
+  (seen, results) = history
+  start = seen.get(fingerprint)
+  seen[fingerprint] = generation
+  results.append(result)
+  if start is None or generation - start < 2:
+    return None
+
+  period = generation - start
+  end = generation
+  while rng.randint(100, 200) != end and end < 200:
+    end += 1
+  cycles.update(generations=end, skipped=end - generation, period=period)
+  # The state at the stopping point is the same as one period earlier
+  return results[start - 1 + (end - start) % period]
+
+
+def run_batch(graph, all_mappings, rngs, indexed=False, cycles=None):
+  """
+  Function: run_batch
+  -------------------
+  Runs one game per node mapping on a CSRGraph, advancing all of them
+  together. The colors of every game are stored as one nodes x games array,
+  so each generation is a single sparse matrix product over the adjacencies,
+  and a game drops out of the batch as soon as it stops. Returns the results
+  in the order of all_mappings; they are the same as run_simulation_csr gives
+  with the same random number generators.
+
+  graph: A CSRGraph representation of the graph adjacencies.
+  all_mappings: A list of dictionaries, where the key is a name and the value
+                is a list of seed nodes associated with that name.
+  rngs: The random number generators used for the stopping point of each
+        game (which must be distinct, to match run_simulation_csr).
+  indexed: Whether the seed nodes are given as node indices of graph.
+  cycles: If given, cycle detection is enabled, and this list receives the
+          statistics of each game (see find_cycle), in the order of
+          all_mappings.
+  """
+  teams = max(len(mappings) for mappings in all_mappings) + 1
+  curr = np.stack([init_csr(graph, mappings, indexed)
+                   for mappings in all_mappings], axis=1)
+  # Preallocated buffer for the next generation, swapped with curr
+  spare = np.empty_like(curr)
+  # Games still in the batch, as indices into all_mappings
+  games = np.arange(len(all_mappings))
+  results = [None] * len(all_mappings)
+  generation = 1
+
+  # Cycle detection history and statistics of each game
+  if cycles is not None:
+    histories = [({}, []) for mappings in all_mappings]
+    game_cycles = [{} for mappings in all_mappings]
+  prev = None
+  while True:
+    # Same cycle detection as run_simulation_csr, for each game in the batch
+    if cycles is not None:
+      stopped = np.zeros(len(games), dtype=bool)
+      for (i, game) in enumerate(games):
+        results[game] = find_cycle(
+          histories[game], generation, fingerprint_csr(curr[:, i], teams),
+          get_result_csr(all_mappings[game].keys(), curr[:, i]), rngs[game],
+          game_cycles[game])
+        stopped[i] = results[game] is not None
+      if stopped.all():
+        break
+      if stopped.any():
+        games = games[~stopped]
+        curr = curr[:, ~stopped]
+        prev = None if prev is None else prev[:, ~stopped]
+        spare = np.empty_like(curr)
+    # Same stopping rule (and random number draws) as run_simulation, for
+    # each game in the batch
+    changed = None if prev is None else (prev != curr).any(axis=0)
+    stopped = np.zeros(len(games), dtype=bool)
+    for (i, game) in enumerate(games):
+      stopped[i] = is_stable_batch(generation, rngs[game].randint(100, 200),
+                                   changed, i)
+    for i in np.flatnonzero(stopped):
+      results[games[i]] = get_result_csr(all_mappings[games[i]].keys(),
+                                         curr[:, i])
+      if cycles is not None:
+        game_cycles[games[i]].update(generations=generation, skipped=0,
+                                     period=None)
+    if stopped.all():
+      break
+    # Drop the stopped games out of the batch
+    if stopped.any():
+      games = games[~stopped]
+      curr = curr[:, ~stopped]
+      spare = np.empty_like(curr)
+    update_batch(graph, teams, curr, spare)
+    prev, curr, spare = curr, spare, curr
+    generation += 1
+
+  if cycles is not None:
+    cycles.extend(game_cycles)
+  return results
+
+
+def reverse_adjacency(adj_list):
+  """
+  Function: reverse_adjacency
+  ---------------------------
+  Maps each node to the set of nodes that have it as a neighbor.
+  """
+  reverse = dict([(node, set()) for node in adj_list.keys()])
+  for (node, neighbors) in adj_list.items():
+    for neighbor in neighbors:
+      reverse[neighbor].add(node)
+  return reverse
+
+
 def init(color_nodes, node_color):
   """
   Function: init
@@ -173,6 +699,96 @@ def update(adj_list, node_color, node):
   return (False, node_color[node])
 
 
+def init_csr(graph, color_nodes, indexed=False):
+  """
+  Function: init_csr
+  ------------------
+  Returns the initial color array of a CSRGraph. As in init, nodes which are
+  seeded more than once are left uncolored.
+  """
+  node_color = np.zeros(len(graph), dtype=np.int32)
+  claims = np.zeros(len(graph), dtype=np.int32)
+  for team, nodes in enumerate(color_nodes.values(), 1):
+    for node in nodes:
+      index = node if indexed else graph.index[node]
+      node_color[index] = team
+      claims[index] += 1
+  node_color[claims > 1] = 0
+  return node_color
+
+
+def update_csr(graph, bins, teams, node_color, out):
+  """
+  Function: update_csr
+  --------------------
+  Updates every node based on its neighbors, writing the new colors into out.
+  Votes are doubled so that the 1.5 self-weight stays integral.
+  """
+  n = len(graph)
+  # Count the neighbors of each node having each color (column 0 is uncolored)
+  team_count = np.bincount(bins + node_color[graph.neighbors],
+                           minlength=n * teams).reshape(n, teams)
+  colored_neighbors = graph.degree - team_count[:, 0]
+  votes = 2 * team_count[:, 1:]
+  colored = np.flatnonzero(node_color)
+  votes[colored, node_color[colored] - 1] += 3
+  most_common = votes.argmax(axis=1)
+  changed = votes[np.arange(n), most_common] > colored_neighbors
+  np.copyto(out, node_color)
+  out[changed] = most_common[changed] + 1
+
+
+def update_batch(graph, teams, node_color, out):
+  """
+  Function: update_batch
+  ----------------------
+  Updates every node of every game in a nodes x games color array, as
+  update_csr does for a single game, writing the new colors into out.
+  """
+  (n, games) = node_color.shape
+  # Whether each node has each color (excluding no color), in each game
+  own = node_color[:, None, :] == \
+    np.arange(1, teams, dtype=node_color.dtype)[None, :, None]
+  # Count the neighbors having each color, for all games in one product
+  votes = (graph.adjacency @ own.reshape(n, -1).astype(np.int32)) \
+    .reshape(n, teams - 1, games)
+  colored_neighbors = votes.sum(axis=1)
+  votes *= 2
+  votes += 3 * own
+  # Find the most common color, keeping the first of any ties as argmax does
+  most_common = votes[:, 0, :].copy()
+  out.fill(1)
+  for team in range(2, teams):
+    better = votes[:, team - 1, :] > most_common
+    np.copyto(most_common, votes[:, team - 1, :], where=better)
+    out[better] = team
+  np.copyto(out, node_color, where=most_common <= colored_neighbors)
+
+
+def update_frontier_csr(graph, teams, node_color, nodes):
+  """
+  Function: update_frontier_csr
+  -----------------------------
+  Updates the given nodes based on their neighbors, in place. Returns the
+  indices of the nodes which changed color, and their previous colors.
+  """
+  n = len(nodes)
+  rows, neighbors = graph.select(nodes)
+  # Same vote as update_csr, restricted to the given nodes
+  team_count = np.bincount(rows * teams + node_color[neighbors],
+                           minlength=n * teams).reshape(n, teams)
+  colored_neighbors = graph.degree[nodes] - team_count[:, 0]
+  votes = 2 * team_count[:, 1:]
+  own = node_color[nodes]
+  colored = np.flatnonzero(own)
+  votes[colored, own[colored] - 1] += 3
+  most_common = votes.argmax(axis=1) + 1
+  changed = (votes[np.arange(n), most_common - 1] > colored_neighbors) & \
+    (most_common != own)
+  node_color[nodes[changed]] = most_common[changed]
+  return (nodes[changed], own[changed])
+
+
 def is_stable(generation, max_rounds, prev, curr):
   """
   Function: is_stable
@@ -189,6 +805,48 @@ def is_stable(generation, max_rounds, prev, curr):
   return True
 
 
+def is_stable_csr(generation, max_rounds, prev, curr):
+  """
+  Function: is_stable_csr
+  -----------------------
+  Checks whether or not the epidemic has stabilized, for color arrays.
+  """
+  if generation <= 1 or prev is None:
+    return False
+  if generation == max_rounds:
+    return True
+  return np.array_equal(prev, curr)
+
+
+def is_stable_frontier(generation, max_rounds, changed):
+  """
+  Function: is_stable_frontier
+  ----------------------------
+  Checks whether or not the epidemic has stabilized, given the nodes which
+  changed in the last generation (None before the first generation).
+  """
+  if generation <= 1 or changed is None:
+    return False
+  if generation == max_rounds:
+    return True
+  return len(changed) == 0
+
+
+def is_stable_batch(generation, max_rounds, changed, i):
+  """
+  Function: is_stable_batch
+  -------------------------
+  Checks whether or not the epidemic of the ith game of a batch has
+  stabilized, given which games changed in the last generation (None before
+  the first generation).
+  """
+  if generation <= 1 or changed is None:
+    return False
+  if generation == max_rounds:
+    return True
+  return not changed[i]
+
+
 def get_result(colors, node_color):
   """
   Function: get_result
@@ -204,5 +862,49 @@ def get_result(colors, node_color):
   return color_nodes
 
 
+def fingerprint_csr(node_color, teams, nodes=None):
+  """
+  Function: fingerprint_csr
+  -------------------------
+  Returns a 64-bit fingerprint of the colors of the given nodes (or all
+  nodes), which is the XOR of a hash of each (node, color) pair. The
+  fingerprint of a whole color array can therefore be updated by XOR-ing out
+  the old colors of the nodes that changed, and XOR-ing in their new colors.
+  """
+  if nodes is None:
+    nodes = np.arange(len(node_color))
+  # SplitMix64 finalizer, applied to each (node, color) pair
+  x = nodes.astype(np.uint64) * np.uint64(teams) + node_color.astype(np.uint64)
+  x += np.uint64(0x9E3779B97F4A7C15)
+  x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+  x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+  x ^= x >> np.uint64(31)
+  return int(np.bitwise_xor.reduce(x))
+
+
+def get_result_csr(colors, node_color):
+  """
+  Function: get_result_csr
+  ------------------------
+  Get the resulting mapping of colors to the number of nodes of that color,
+  for color arrays.
+  """
+  return count_result(colors, np.bincount(node_color,
+                                          minlength=len(colors) + 1))
+
+
+def count_result(colors, counts):
+  """
+  Function: count_result
+  ----------------------
+  Get the resulting mapping of colors to the number of nodes of that color,
+  from the number of nodes of each color index.
+  """
+  color_nodes = {}
+  for team, color in enumerate(colors, 1):
+    color_nodes[color] = int(counts[team])
+  return color_nodes
+
+
 if __name__ == '__main__':
   print(USAGE)
@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+import pytest
+
+# The metrics need the compiled interface (built by make)
+pytest.importorskip("interface")
+nx = pytest.importorskip("networkx")
+
+from context import to_networkx
+from graph import as_csr
+import centrality
+
+def test_closeness_matches_networkx(adj):
+    graph = as_csr(adj)
+    G = to_networkx(graph)
+    exact = nx.closeness_centrality(G)
+    expected = np.array([exact[node] for node in graph.id_list()])
+    rank, computed = centrality.closeness(graph)
+    assert computed.all()
+    np.testing.assert_allclose(rank, expected)
+    # With a count, the top nodes are still computed exactly
+    rank, computed = centrality.closeness(graph, 10)
+    top = np.argsort(-expected, kind="stable")[:10]
+    assert computed[top].all()
+    np.testing.assert_allclose(rank[computed], expected[computed])
+
+def test_betweenness_with_every_pivot_is_exact(adj):
+    graph = as_csr(adj)
+    exact = nx.betweenness_centrality(to_networkx(graph))
+    estimate, _, report = centrality.approximate_betweenness(
+        graph, 5, pivots=len(graph), seed=0)
+    assert report["exact"]
+    np.testing.assert_allclose(
+        estimate, [exact[node] for node in graph.id_list()], atol=1e-12)
+
+def bfs_count(adj, node, generations):
+    # Walk counts of the original iterated degree metric
+    frontier = [[node]]
+    for i in range(generations):
+        frontier.append([n for m in frontier[-1] for n in adj[m]])
+    return sum(len(gen) for gen in frontier[1:])
+
+@pytest.mark.parametrize("generations", [1, 2, 3])
+def test_iterated_degree_matches_bfs_count(adj, generations):
+    graph = as_csr(adj)
+    walks = centrality.iterated_degree(graph, generations)
+    assert walks.tolist() == [bfs_count(adj, node, generations)
+                              for node in graph.id_list()]
+
+def test_core_numbers_match_networkx(adj):
+    graph = as_csr(adj)
+    G = to_networkx(graph)
+    G.remove_edges_from(nx.selfloop_edges(G))
+    exact = nx.core_number(G)
+    assert centrality.core_numbers(graph).tolist() == \
+        [exact[node] for node in graph.id_list()]
+
+def test_metrics_stop_at_their_deadlines(adj):
+    graph = as_csr(adj)
+    # Nothing is computed once the deadline has passed
+    stats = {}
+    rank, computed = centrality.closeness(
+        graph, 5, deadline=time.perf_counter() - 1, stats=stats)
+    assert stats["truncated"] and stats["searched"] == 0
+    assert not computed.any()
+    # A betweenness budget which fits no pivots samples none, and reports it
+    estimate, error, report = centrality.approximate_betweenness(
+        graph, 5, budget=1e-9, seed=0)
+    assert report["pivots"] == 0 and report["truncated"]
+    assert not report["separated"]
+    assert not estimate.any() and np.isinf(error).all()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+# The metrics need the compiled interface (built by make)
+pytest.importorskip("interface")
+
+import centrality
+import context
+
+def fail(*args, **kwargs):
+    raise AssertionError("the ranking was computed again")
+
+def test_rankings_are_stored_and_reused(adj, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    first = context.GraphContext(adj, cache_dir)
+    walks = first.iterated_degree(2)
+    rank, computed = first.closeness()
+    # A new context for the same graph reads the stored rankings
+    monkeypatch.setattr(centrality, "iterated_degree", fail)
+    monkeypatch.setattr(centrality, "closeness", fail)
+    second = context.GraphContext(adj, cache_dir)
+    assert second.iterated_degree(2).tolist() == walks.tolist()
+    assert second.closeness(10)[0].tolist() == rank.tolist()
+    # Without a cache directory, rankings are only kept in memory
+    with pytest.raises(AssertionError):
+        context.GraphContext(adj).iterated_degree(2)
+
+def test_rankings_of_other_graphs_are_not_used(adj, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    shared = context.GraphContext(adj, cache_dir)
+    shared.iterated_degree(1)
+    other = context.GraphContext({0: [1], 1: [0, 2], 2: [1]}, cache_dir)
+    assert other.digest != shared.digest
+    assert other.stored("iterated-1") is None
+    # Rankings stored by another version are ignored
+    monkeypatch.setattr(context, "FORMAT_VERSION", context.FORMAT_VERSION + 1)
+    assert context.GraphContext(adj, cache_dir).stored("iterated-1") is None
+
+def test_closeness_is_reused_for_smaller_counts(adj, tmp_path, monkeypatch):
+    shared = context.GraphContext(adj, str(tmp_path))
+    rank, computed = shared.closeness(5)
+    calls = []
+    closeness = centrality.closeness
+    def record(*args, **kwargs):
+        calls.append(args)
+        return closeness(*args, **kwargs)
+    monkeypatch.setattr(centrality, "closeness", record)
+    # A ranking of the top 5 serves any smaller count, but not a larger one
+    assert shared.closeness(3)[1].tolist() == computed.tolist()
+    assert not calls
+    shared.closeness(20)
+    assert len(calls) == 1
+    # Rankings limited to some sources are never kept
+    shared.closeness(40, eligible=np.ones(len(adj), dtype=bool), limit=4)
+    assert int(shared.stored("closeness")["count"]) == 20
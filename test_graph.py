@@ -0,0 +1,98 @@
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+
+from graph import cache_location, load_cached, load_json
+
+def random_adj_list(n, seed):
+    # Random adjacency list with many isolated nodes, and neighbor IDs which
+    # are sometimes quoted, as real graph files have
+    r = random.Random(seed)
+    nodes = r.sample(range(-n, 4 * n), n)
+    adj = {}
+    for node in nodes:
+        count = r.choice([0, 0, 1, 2, 5])
+        adj[str(node)] = [r.choice([m, str(m)]) for m in
+                          (r.choice(nodes) for i in range(count))]
+    return adj
+
+def expected(path):
+    # The adjacency list as parsed by the json module, with integer IDs
+    with open(path) as f:
+        return {int(node): [int(m) for m in neighbors]
+                for node, neighbors in json.load(f).items()}
+
+def parsed(path, chunk_size):
+    graph = load_json(path, chunk_size=chunk_size)
+    return {node: graph[node] for node in graph}
+
+@pytest.mark.parametrize("text", [
+    '{}', ' { } ', '{"1": [], "2": []}', '{"1": [ ]}',
+    '{"1": [2], "2": [ ], "3": []}', '{"1": ["2", 3], "2": [], "3": [1]}'])
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1 << 20])
+def test_load_json_small(tmp_path, text, chunk_size):
+    path = tmp_path / "graph.json"
+    path.write_text(text)
+    assert parsed(str(path), chunk_size) == expected(str(path))
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("indent", [None, 2])
+def test_load_json_matches_json_for_any_chunk_size(tmp_path, seed, indent):
+    path = tmp_path / "graph.json"
+    path.write_text(json.dumps(random_adj_list(200, seed), indent=indent))
+    reference = expected(str(path))
+    # Chunk boundaries fall at every position within entries
+    for chunk_size in [1, 3, 16, 64, 65, 100, 1000, 1 << 20]:
+        assert parsed(str(path), chunk_size) == reference, chunk_size
+
+@pytest.mark.parametrize("text", [
+    '{"1": [4294967298], "2": [1]}', '{"4294967297": []}', '{"1": [2,]}',
+    '{"1": [x]}', '{"1": [1]', ''])
+def test_load_json_rejects_invalid_lists(tmp_path, text):
+    path = tmp_path / "graph.json"
+    path.write_text(text)
+    with pytest.raises((ValueError, KeyError)):
+        load_json(str(path), chunk_size=4)
+
+def test_load_cached_compiles_once(tmp_path):
+    path = tmp_path / "graph.json"
+    path.write_text(json.dumps(random_adj_list(100, 0)))
+    cache_dir = str(tmp_path / "cache")
+    reference = expected(str(path))
+    stats = {}
+    assert dict(load_cached(str(path), cache_dir, stats).items()) == \
+        reference
+    assert "peak_bytes" in stats
+    # Later loads memory-map the compiled graph, without parsing
+    stats = {}
+    graph = load_cached(str(path), cache_dir, stats)
+    assert isinstance(graph.offsets, np.memmap) and not stats
+    assert dict(graph.items()) == reference
+
+def test_load_cached_recompiles_changed_graphs(tmp_path):
+    path = tmp_path / "graph.json"
+    path.write_text(json.dumps(random_adj_list(100, 0)))
+    load_cached(str(path))
+    # A changed source file is parsed again, even if its size is the same
+    changed = random_adj_list(100, 1)
+    path.write_text(json.dumps(changed))
+    os.utime(path, ns=(0, 0))
+    graph = load_cached(str(path))
+    assert not isinstance(graph.offsets, np.memmap)
+    assert dict(graph.items()) == expected(str(path))
+    # So is one whose compiled metadata is unreadable
+    with open(os.path.join(cache_location(str(path)), "meta.json"), "w") as f:
+        f.write("{")
+    assert not isinstance(load_cached(str(path)).offsets, np.memmap)
+    assert isinstance(load_cached(str(path)).offsets, np.memmap)
+
+def test_cache_locations_are_distinct(tmp_path):
+    # Graphs with the same name in different directories are compiled to
+    # different places in a shared cache directory
+    first = cache_location(str(tmp_path / "a" / "graph.json"), "cache")
+    second = cache_location(str(tmp_path / "b" / "graph.json"), "cache")
+    assert first != second
+    assert cache_location("graph.json") == "graph.json.csr"
@@ -0,0 +1,40 @@
+import pytest
+
+# The lazy greedy heap is in the compiled interface (built by make)
+pytest.importorskip("interface")
+
+from graph import as_csr
+import greedy
+
+def test_celf_ends_oscillating_games():
+    # Complete bipartite graph on which every game oscillates, and some games
+    # never draw a stopping point
+    A = list(range(3))
+    B = list(range(3, 10))
+    adj = {a: list(B) for a in A}
+    adj.update({b: list(A) for b in B})
+    chosen, report = greedy.celf(as_csr(adj), 1, [1, 2], [3, 4, 5], base=[0],
+                                 games=10, seed=7)
+    assert len(chosen) == 1 and not report["truncated"]
+
+@pytest.mark.parametrize("count", [1, 3])
+def test_celf_chooses_the_largest_gains(adj, count):
+    graph = as_csr(adj)
+    candidates = list(range(0, len(graph), 3))
+    opponents = [1, 2, 4]
+    base = [5]
+    chosen, report = greedy.celf(graph, count, candidates, opponents, base,
+                                 games=4)
+    assert len(chosen) == count
+    assert len(set(chosen) | set(base)) == count + len(base)
+    # Every gain is fresh in the first round, so the first node gains as much
+    # as any other candidate (later rounds are lazy, as gains are not
+    # submodular)
+    rest = [c for c in candidates if c not in base]
+    margins = greedy._evaluate(graph, base, rest, opponents, 4, 0)
+    assert margins[rest.index(chosen[0])] == max(margins)
+    # The reported margin is that of the base & chosen seeds together
+    base = base + chosen
+    assert report["margin"] == pytest.approx(
+        greedy._evaluate(graph, base, [None], opponents, 4, 0)[0])
+    assert report["evaluations"] >= len(candidates)
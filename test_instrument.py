@@ -0,0 +1,76 @@
+import io
+
+import pytest
+
+from graph import as_csr
+import instrument
+import sim
+
+@pytest.fixture
+def output(monkeypatch):
+    # Enable instrumentation for one test, reporting to a string
+    stream = io.StringIO()
+    monkeypatch.setattr(instrument, "enabled", False)
+    monkeypatch.setattr(instrument, "stream", instrument.stream)
+    monkeypatch.setattr(instrument, "totals", {})
+    instrument.enable(stream)
+    yield stream
+    instrument.disable()
+
+def test_spans_add_up(output):
+    for i in range(3):
+        with instrument.span("outer"):
+            with instrument.span("inner"):
+                pass
+    assert instrument.totals["outer"][0] == 3
+    assert instrument.totals["inner"][0] == 3
+    assert instrument.totals["inner"][1] <= instrument.totals["outer"][1]
+    # Spans are reported in the order they first ended
+    instrument.report()
+    assert [line.split()[:2] for line in output.getvalue().splitlines()] == \
+        [["inner", "3"], ["outer", "3"]]
+    instrument.reset()
+    assert instrument.totals == {}
+
+def test_disabled_spans_do_nothing(monkeypatch):
+    monkeypatch.setattr(instrument, "enabled", False)
+    monkeypatch.setattr(instrument, "totals", {})
+    with instrument.span("ignored"):
+        pass
+    assert instrument.totals == {}
+    assert instrument.span("ignored") is instrument.NULL_SPAN
+    assert instrument.generation_callback("simulation") is None
+
+def test_generation_callbacks(adj):
+    mappings = {"a": [0, 1, 2], "b": [3, 4, 5]}
+    graph = as_csr(adj)
+    expected = None
+    for simulate, g in [(sim.run_simulation, adj),
+                        (sim.run_simulation_csr, graph),
+                        (sim.run_frontier_csr, graph)]:
+        calls = []
+        result = simulate(g, mappings, sim.game_rng(0, 0),
+                          callback=lambda *args: calls.append(args))
+        assert result == sim.run_simulation(adj, mappings, sim.game_rng(0, 0))
+        # Every generation after the first is reported once, in order, with
+        # the same number of changed nodes by every engine
+        assert [call[0] for call in calls] == \
+            list(range(2, len(calls) + 2))
+        assert all(call[2] >= 0 for call in calls)
+        changed = [call[1] for call in calls]
+        if expected is None:
+            expected = changed
+        assert changed == expected
+    assert expected and expected[0] > 0
+
+def test_default_callback_reports_generations(output, adj):
+    sim.run(adj, {"a": [[0, 1]], "b": [[2, 3]]}, 1, engine=sim.CSR, seed=0)
+    lines = output.getvalue().splitlines()
+    assert lines and all(line.startswith("simulation generation ")
+                         for line in lines)
+    assert instrument.totals["simulation/generation"][0] == len(lines)
+
+def test_callbacks_need_serial_games(adj):
+    for kwargs in [{"processes": 2}, {"batch": 2}]:
+        with pytest.raises(ValueError):
+            sim.run(adj, {"a": [[0]]}, 1, callback=print, **kwargs)
@@ -0,0 +1,50 @@
+import random
+
+import numpy as np
+import pytest
+
+# The heaps are in the compiled interface (built by make)
+interface = pytest.importorskip("interface")
+
+def test_indexed_heap_matches_dict():
+    r = random.Random(0)
+    heap = interface.indexed_heap()
+    # Maps ID -> rank of the IDs in the heap (ranks are distinct integers, so
+    # that the maximum is unique & exact as a float)
+    ranks = {}
+    values = r.sample(range(1 << 20), 5000)
+    for step in range(2000):
+        action = r.random()
+        ID = r.randrange(200)
+        if action < 0.5:
+            # Insert the ID, or update its rank
+            ranks[ID] = values.pop()
+            heap.insert(ranks[ID], ID)
+        elif action < 0.7 and ID in ranks:
+            heap.remove(ID)
+            del ranks[ID]
+        elif action < 0.9 and ranks:
+            expected = max(ranks, key=ranks.get)
+            assert heap.peek_max()[0] == expected
+            ID, rank = heap.get_max()
+            assert ID == expected and rank == ranks.pop(ID)
+        assert heap.size() == len(ranks)
+        assert all(ID in heap for ID in ranks)
+    # An empty heap has no maximum
+    while heap.size():
+        heap.get_max()
+    with pytest.raises(IndexError):
+        heap.peek_max()
+    with pytest.raises(IndexError):
+        heap.get_max()
+
+def test_rank_heap_drain_matches_sort():
+    r = random.Random(1)
+    ranks = np.array(r.sample(range(1 << 20), 1000), dtype=np.float64)
+    IDs = np.arange(1000, dtype=np.int64)
+    heap = interface.rank_heap(50)
+    heap.insert_many(ranks, IDs)
+    drained, drained_ranks = heap.drain()
+    order = np.argsort(-ranks)[:50]
+    assert drained.tolist() == IDs[order].tolist()
+    assert drained_ranks.tolist() == ranks[order].tolist()
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+# The metrics & heaps need the compiled interface (built by make)
+pytest.importorskip("interface")
+
+from context import to_networkx
+from graph import as_csr
+import greedy
+import metrics
+import seeds
+
+def test_greedy_plays_against_a_full_team(adj, monkeypatch):
+    graph = as_csr(adj)
+    played = []
+    celf = greedy.celf
+    def record(graph, count, candidates, opponents, *args):
+        played.append(opponents)
+        return celf(graph, count, candidates, opponents, *args)
+    monkeypatch.setattr(greedy, "celf", record)
+    selector = seeds.SeedSelector(graph, degree=3, greedy=2, greedy_games=2)
+    # The opponent plays the 5 highest degree nodes, as many seeds as our
+    # degree & greedy seeds together, so it is not cancelled out entirely
+    assert len(set(played[0])) == 5
+    assert sorted(graph.degree[played[0]]) == sorted(graph.degree)[-5:]
+    assert selector.reports["greedy"]["margin"] < len(graph)
+    assert len(selector.choose()) == 5
+
+@pytest.mark.parametrize("kwargs", [{"greedy_games": 0}, {"prune": 0.5},
+                                    {"prune": 2}])
+def test_invalid_arguments_are_rejected(adj, kwargs):
+    with pytest.raises(ValueError):
+        seeds.SeedSelector(as_csr(adj), greedy=1, between=1, **kwargs)
+
+def test_past_deadline_fills_every_metric_by_degree(adj):
+    graph = as_csr(adj)
+    counts = {"degree": 2, "close": 2, "between": 2, "iterated": 2}
+    selector = seeds.SeedSelector(graph, deadline=time.perf_counter() - 1,
+                                  **counts)
+    # The metrics are skipped in order of cost, and each one's seeds are the
+    # highest degree nodes that the metrics before it did not take
+    assert selector.progress == {metric: metrics.SKIPPED
+                                 for metric in counts}
+    assert selector.filled == counts
+    chosen = selector.choose()
+    assert len(set(chosen)) == 8
+    assert sorted(graph.degree[[graph.index[node] for node in chosen]]) == \
+        sorted(graph.degree)[-8:]
+
+@pytest.mark.parametrize("metric", ["degree", "close", "iterated",
+                                    "discount"])
+def test_generous_deadline_matches_no_deadline(adj, metric):
+    graph = as_csr(adj)
+    expected = seeds.SeedSelector(graph, **{metric: 3})
+    selector = seeds.SeedSelector(graph, deadline=time.perf_counter() + 60,
+                                  **{metric: 3})
+    assert selector.progress == {metric: metrics.FINISHED}
+    assert selector.filled == {}
+    assert selector.seeds == expected.seeds
+
+def test_pruning_everything_changes_nothing(adj):
+    graph = as_csr(adj)
+    # Pruning to at least every node evaluates every candidate, as without
+    # pruning
+    expected = seeds.SeedSelector(graph, close=3)
+    pruned = seeds.SeedSelector(graph, close=3, prune=len(graph))
+    assert pruned.seeds == expected.seeds
+
+def test_pruned_seeds_are_exact_candidates(adj):
+    nx = pytest.importorskip("networkx")
+    graph = as_csr(adj)
+    G = to_networkx(graph)
+    G.remove_edges_from(nx.selfloop_edges(G))
+    core = nx.core_number(G)
+    selector = seeds.SeedSelector(graph, close=2, between=2, prune=1.5,
+                                  between_pivots=len(graph))
+    assert len(selector.seeds["close"]) == 2
+    # Betweenness seeds are among the 3 eligible nodes (of degree > 1, not
+    # chosen by closeness) with the highest core numbers, ties broken by
+    # their 2-hop reach
+    reach = selector.context.candidates()["reach"]
+    eligible = [node for node in graph
+                if G.degree(node) > 1 and node not in selector.seeds["close"]]
+    eligible.sort(key=lambda node: (-core[node], -reach[graph.index[node]]))
+    assert len(selector.seeds["between"]) == 2
+    assert selector.seeds["between"] <= set(eligible[:3])
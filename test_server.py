@@ -0,0 +1,93 @@
+import io
+import json
+import os
+import threading
+
+import pytest
+
+# Seeds are chosen with the compiled interface (built by make)
+pytest.importorskip("interface")
+
+import instrument
+import server
+
+@pytest.fixture
+def running(tmp_path):
+    # A server listening on a socket in a temporary directory, with a small
+    # selector cache
+    path = str(tmp_path / "server.sock")
+    seed_server = server.SeedServer(path, cache_dir=str(tmp_path / "cache"),
+                                    selectors=2)
+    thread = threading.Thread(target=seed_server.serve_forever)
+    thread.start()
+    yield seed_server, path
+    seed_server.shutdown()
+    thread.join()
+    seed_server.server_close()
+
+def write_graph(path, adj):
+    with open(path, "w") as f:
+        json.dump({str(node): neighbors for (node, neighbors) in adj.items()},
+                  f)
+
+def test_round_trip(running, adj, tmp_path):
+    seed_server, path = running
+    graph = str(tmp_path / "graph.json")
+    write_graph(graph, adj)
+    message = {"graph": graph, "kwargs": {"degree": 3, "close": 2},
+               "trials": 2}
+    response = server.request(path, message)
+    assert len(response["seeds"]) == 2
+    assert all(len(set(seeds)) == 5 and set(seeds) <= set(adj)
+               for seeds in response["seeds"])
+    # Repeated requests reuse the same selection
+    assert server.request(path, message)["seeds"] == response["seeds"]
+    assert len(seed_server.selectors) == 1
+    # Invalid requests are answered with errors
+    with pytest.raises(RuntimeError, match="unknown arguments: bogus"):
+        server.request(path, {"graph": graph, "kwargs": {"bogus": 1}})
+    with pytest.raises(RuntimeError, match="opponent seed"):
+        server.request(path, {"graph": graph,
+                              "kwargs": {"greedy": 1, "opponents": [-5]}})
+
+def test_graph_changes_are_reloaded(running, adj, tmp_path):
+    seed_server, path = running
+    graph = str(tmp_path / "graph.json")
+    write_graph(graph, adj)
+    message = {"graph": graph, "kwargs": {"degree": 1}}
+    server.request(path, message)
+    # Give the hub of a star every other node as a neighbor
+    star = {node: [0] for node in adj}
+    star[0] = [node for node in adj if node != 0]
+    write_graph(graph, star)
+    os.utime(graph, ns=(0, 0))
+    assert server.request(path, message)["seeds"] == [[0]]
+
+def test_selectors_are_bounded(running, adj, tmp_path):
+    seed_server, path = running
+    graph = str(tmp_path / "graph.json")
+    write_graph(graph, adj)
+    for count in [1, 2, 1, 3]:
+        server.request(path, {"graph": graph, "kwargs": {"degree": count}})
+    # The least recently used selector (for 2 seeds) was evicted
+    assert [json.loads(kwargs)["degree"]
+            for (_, kwargs) in seed_server.selectors] == [1, 3]
+    # Requests with a deadline are never kept
+    server.request(path, {"graph": graph, "kwargs": {"degree": 4},
+                          "deadline": 10})
+    assert len(seed_server.selectors) == 2
+
+def test_each_request_is_reported_separately(running, adj, tmp_path,
+                                             monkeypatch):
+    seed_server, path = running
+    graph = str(tmp_path / "graph.json")
+    write_graph(graph, adj)
+    output = io.StringIO()
+    monkeypatch.setattr(instrument, "enabled", True)
+    monkeypatch.setattr(instrument, "stream", output)
+    for count in [1, 2]:
+        server.request(path, {"graph": graph, "kwargs": {"degree": count}})
+    # Each report only counts the one selection of its request
+    reports = [line.split() for line in output.getvalue().splitlines()
+               if line.startswith("generate")]
+    assert [report[1] for report in reports] == ["1", "1"]
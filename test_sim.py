@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from graph import as_csr
+import sim
+
+# Random seed of every game in these tests
+SEED = 7
+# Number of games played per engine comparison
+GAMES = 6
+
+def oscillator():
+    # Complete bipartite graph on which the game below flips between two
+    # states with different results, so it never stabilizes
+    A = list(range(3))
+    B = list(range(3, 10))
+    adj = {a: list(B) for a in A}
+    adj.update({b: list(A) for b in B})
+    return adj, {"a": [0, 1], "b": [3, 4, 5]}
+
+def seed_mappings(adj, teams, count, seed):
+    # One random seed set per team for each game
+    r = random.Random(seed)
+    nodes = list(adj)
+    return {"team{}".format(t): [r.sample(nodes, count) for i in range(GAMES)]
+            for t in range(teams)}
+
+def reference(adj, node_mappings):
+    # Results of the original dictionary engine, for each game
+    return [res for (res, _) in sim.run(adj, node_mappings, GAMES,
+                                        engine=sim.DICT, seed=SEED)]
+
+@pytest.mark.parametrize("teams", [2, 3])
+def test_engines_match_reference(adj, teams):
+    node_mappings = seed_mappings(adj, teams, 4, teams)
+    expected = reference(adj, node_mappings)
+    # Every engine plays the same games, with the same stopping points
+    for kwargs in [{"engine": sim.CSR}, {"engine": sim.DICT,
+                                          "incremental": True},
+                   {"engine": sim.CSR, "incremental": True},
+                   {"batch": 4}, {"processes": 2},
+                   {"processes": 2, "incremental": True}]:
+        results = sim.run(adj, node_mappings, GAMES, seed=SEED, **kwargs)
+        assert [res for (res, _) in results] == expected, kwargs
+
+def stops(seed, i):
+    # Whether game i draws a stopping point before generation 200, which the
+    # original engine needs to end a game that never stabilizes
+    rng = sim.game_rng(seed, i)
+    return any(rng.randint(100, 200) == g for g in range(1, 201))
+
+def test_find_cycle_matches_reference():
+    adj, mappings = oscillator()
+    graph = as_csr(adj)
+    games = [i for i in range(20) if stops(SEED, i)][:GAMES]
+    outcomes = set()
+    for i in games:
+        expected = sim.run_simulation(adj, mappings, sim.game_rng(SEED, i))
+        outcomes.add(tuple(sorted(expected.items())))
+        # Every engine skips the rest of the cycle, with the same result
+        for simulate, g in [(sim.run_simulation, adj),
+                            (sim.run_simulation_csr, graph),
+                            (sim.run_frontier_csr, graph)]:
+            cycles = {}
+            assert simulate(g, mappings, sim.game_rng(SEED, i),
+                            cycles=cycles) == expected
+            assert cycles["period"] == 2 and cycles["skipped"] > 0
+    # Both states of the cycle are reached, so the stopping point matters
+    assert len(outcomes) == 2
+
+def test_batch_detects_cycles():
+    adj, mappings = oscillator()
+    graph = as_csr(adj)
+    # Include games which never draw a stopping point, which only end
+    # because the cycle is detected
+    games = range(20)
+    assert not all(stops(SEED, i) for i in games)
+    expected = []
+    for i in games:
+        cycles = {}
+        expected.append((sim.run_simulation_csr(
+            graph, mappings, sim.game_rng(SEED, i), cycles=cycles), cycles))
+    cycles = []
+    results = sim.run_batch(graph, [mappings] * len(games),
+                            [sim.game_rng(SEED, i) for i in games],
+                            cycles=cycles)
+    assert list(zip(results, cycles)) == expected
+    # Batched runs also report the cycles of each game
+    cycles = []
+    sim.run(adj, {team: [seeds] * len(games)
+                  for (team, seeds) in mappings.items()},
+            len(games), batch=8, seed=SEED, cycles=cycles)
+    assert cycles == [game_cycles for (_, game_cycles) in expected]
@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip("scipy")
+
+from graph import as_csr
+import sim
+import tournament
+
+SEED = 7
+
+def strategies(adj):
+    # A strong strategy (the highest degree nodes), a weak one (the lowest
+    # degree nodes) and one with no seeds at all
+    by_degree = sorted(adj, key=lambda node: (-len(adj[node]), node))
+    return {"strong": [by_degree[:4]], "weak": [by_degree[-4:]],
+            "none": [[]]}
+
+def test_play_matches_the_simulator(adj):
+    players = strategies(adj)
+    result = tournament.play(adj, players, "strong", "weak", min_games=8,
+                             max_games=8, seed=SEED)
+    graph = as_csr(adj)
+    margins = []
+    for i in range(8):
+        res = sim.run_simulation_csr(
+            graph, {"strong": players["strong"][0],
+                    "weak": players["weak"][0]},
+            sim.game_rng(SEED, i), cycles={})
+        margins.append((res["strong"] - res["weak"]) / len(graph))
+    assert result["games"] == 8
+    assert result["margin"] == pytest.approx(sum(margins) / 8)
+    assert result["wins"] == sum(m > 0 for m in margins)
+    assert result["losses"] == sum(m < 0 for m in margins)
+
+def test_play_stops_once_decided(adj):
+    players = strategies(adj)
+    result = tournament.play(adj, players, "strong", "none", seed=SEED)
+    # Every game is won outright, so the pairing ends after min_games
+    assert result["games"] == 5 and result["decided"]
+    assert result["wins"] == 5 and result["margin"] > 0
+    # Swapping the strategies negates the margins, game by game
+    swapped = tournament.play(adj, players, "none", "strong", seed=SEED)
+    assert swapped["margin"] == pytest.approx(-result["margin"])
+    assert swapped["losses"] == 5
+
+def test_tournament_ranks_by_score(adj):
+    players = strategies(adj)
+    results = tournament.tournament(adj, players, max_games=10, seed=SEED)
+    ranking = results["ranking"]
+    assert [r["name"] for r in ranking][0] == "strong"
+    assert [r["score"] for r in ranking] == \
+        sorted((r["score"] for r in ranking), reverse=True)
+    assert all(r["low"] <= r["score"] <= r["high"] for r in ranking)
+    assert len(results["pairings"]) == 3
+    assert results["games"] == sum(r["games"] for r in ranking) // 2
+    # Both engines play the same games
+    assert tournament.tournament(adj, players, max_games=10, seed=SEED,
+                                 engine=sim.DICT) == results
@@ -0,0 +1,111 @@
+import itertools
+import math
+import random
+
+from scipy.special import ndtri
+
+from graph import as_csr
+import sim
+
+def _game(simulate, graph, strategies, a, b, seed, i):
+    # Play game i between strategies a & b, returning a's margin as a
+    # fraction of the graph. Game i always draws the same stopping points
+    # (common random numbers), whichever strategies play it, so differences
+    # between pairings are not due to the random cutoffs.
+    mappings = {a: strategies[a][i % len(strategies[a])],
+                b: strategies[b][i % len(strategies[b])]}
+    # Cycle detection gives the same results, but also ends the games which
+    # would otherwise oscillate forever
+    result = simulate(graph, mappings, sim.game_rng(seed, i), cycles={})
+    return (result[a] - result[b]) / len(graph)
+
+def _interval(margins, z):
+    # Mean margin of the games played so far, and the half-width of its
+    # confidence interval
+    mean = sum(margins) / len(margins)
+    if len(margins) < 2:
+        return mean, math.inf
+    variance = sum((m - mean) ** 2 for m in margins) / (len(margins) - 1)
+    return mean, z * math.sqrt(variance / len(margins))
+
+def play(graph, strategies, a, b, confidence=0.95, min_games=5, max_games=50,
+         seed=None, engine=sim.CSR):
+    # Plays games between strategies a & b until the sign of a's mean margin
+    # is settled at the given confidence, or max_games have been played.
+    # Strategies map names -> lists of seed node lists, as node_mappings do
+    # in sim.run (game i uses the ith list, wrapping around). After each game
+    # (from min_games on), the pairing stops if the confidence interval of
+    # the mean margin excludes zero, or if every game had the same margin
+    # (since then the game does not depend on its stopping point). Each look
+    # is tested at (1 - confidence) / max_games, so that stopping early keeps
+    # the overall error rate within 1 - confidence.
+    if seed is None:
+        seed = random.getrandbits(64)
+    if engine == sim.CSR:
+        graph = as_csr(graph)
+        simulate = sim.run_simulation_csr
+    else:
+        simulate = sim.run_simulation
+    z = float(ndtri(1 - (1 - confidence) / (2 * max_games)))
+
+    margins = []
+    while len(margins) < max_games:
+        margins.append(_game(simulate, graph, strategies, a, b, seed,
+                             len(margins)))
+        if len(margins) >= min_games:
+            mean, error = _interval(margins, z)
+            if abs(mean) > error or error == 0:
+                break
+    mean, error = _interval(margins, z)
+    return {"games": len(margins), "margin": mean, "error": error,
+            "wins": sum(m > 0 for m in margins),
+            "losses": sum(m < 0 for m in margins),
+            "decided": abs(mean) > error or error == 0}
+
+def tournament(graph, strategies, confidence=0.95, min_games=5,
+               max_games=50, seed=None, engine=sim.CSR):
+    # Plays every pair of strategies against each other (see play), all with
+    # the same stopping points per game. Returns a ranking of the strategies
+    # by their mean margin over all of their pairings, as a list of dicts
+    # (best first) with confidence intervals at the given confidence, the
+    # results of each pairing, and the total number of games played.
+    if seed is None:
+        seed = random.getrandbits(64)
+    if engine == sim.CSR:
+        # Relabel the graph once, for every pairing
+        graph = as_csr(graph)
+    names = list(strategies)
+    pairings = {}
+    for a, b in itertools.combinations(names, 2):
+        pairings[(a, b)] = play(graph, strategies, a, b, confidence,
+                                min_games, max_games, seed, engine)
+
+    # The pairings are independent estimates, so a strategy's score is their
+    # mean, with the variances of their means added
+    z = float(ndtri(1 - (1 - confidence) / 2))
+    z_pairing = float(ndtri(1 - (1 - confidence) / (2 * max_games)))
+    ranking = []
+    for name in names:
+        margins = []
+        variance = 0.0
+        games = wins = losses = 0
+        for (a, b), result in pairings.items():
+            if name not in (a, b):
+                continue
+            sign = 1 if name == a else -1
+            margins.append(sign * result["margin"])
+            if math.isinf(result["error"]):
+                variance = math.inf
+            else:
+                variance += (result["error"] / z_pairing) ** 2
+            games += result["games"]
+            wins += result["wins"] if sign > 0 else result["losses"]
+            losses += result["losses"] if sign > 0 else result["wins"]
+        score = sum(margins) / len(margins) if margins else 0.0
+        error = z * math.sqrt(variance) / len(margins) if margins else 0.0
+        ranking.append({"name": name, "score": score, "low": score - error,
+                        "high": score + error, "games": games, "wins": wins,
+                        "losses": losses})
+    ranking.sort(key=lambda r: r["score"], reverse=True)
+    return {"ranking": ranking, "pairings": pairings,
+            "games": sum(r["games"] for r in pairings.values())}